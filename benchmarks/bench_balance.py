@@ -0,0 +1,99 @@
+"""Latency and throughput across gateway replicas when one is degraded.
+
+Three stub gateways answer in 2 ms, except that one takes 100 ms. Uncached
+entity reads from several threads are spread by each balancing strategy, with
+and without hedging. Further runs swap the slow replica for one that is down,
+and use replicas that each take 100 ms for a random 3% of requests.
+
+    python -m benchmarks.bench_balance [n_requests] [n_threads]
+"""
+
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+import numpy as np
+
+from qshed.client import QShedClient, config
+
+from .stub_gateway import StubGateway
+
+
+def closed_address() -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}/"
+
+
+def run(addresses, n_requests: int, n_threads: int, strategy: str, hedge):
+    gateways_config = config["gateways"]
+    gateways_config["strategy"] = strategy
+    gateways_config["hedge_percentile"] = hedge
+    client = QShedClient(addresses)
+    errors = 0
+
+    def timed_get(id):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            client.entity.get(id)
+        except Exception:
+            errors += 1
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(n_threads) as executor:
+        start = time.perf_counter()
+        latencies = np.array(list(executor.map(timed_get, range(n_requests))))
+        elapsed = time.perf_counter() - start
+    stats = client.comms.balancer.stats()
+    client.close()
+    to_bad = stats[addresses[-1]]["requests"] / max(n_requests, 1)
+    label = strategy + (f" + hedge p{hedge}" if hedge else "")
+    print(
+        f"{label:<28} {n_requests / elapsed:>8.0f} "
+        f"{np.percentile(latencies, 50) * 1e3:>8.1f} "
+        f"{np.percentile(latencies, 99) * 1e3:>8.1f} {to_bad:>7.0%} {errors:>6}"
+    )
+
+
+def main(n_requests: int = 2000, n_threads: int = 8):
+    config["caching"]["enabled"] = False
+    config["gateways"]["health_interval"] = 0.5
+    with ExitStack() as stack:
+        healthy = [
+            stack.enter_context(StubGateway(latency=0.002)).address for _ in range(2)
+        ]
+        slow = stack.enter_context(StubGateway(latency=0.1)).address
+        print(f"{n_requests} requests, {n_threads} threads")
+        print(
+            f"{'degraded replica':<28} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+            f"{'to bad':>7} {'errors':>6}"
+        )
+        for strategy, hedge in (
+            ("round_robin", None),
+            ("least_outstanding", None),
+            ("ewma", None),
+            ("ewma", 95),
+        ):
+            run(healthy + [slow], n_requests, n_threads, strategy, hedge)
+        spiky = [
+            stack.enter_context(
+                StubGateway(latency=0.002, spike_rate=0.03, spike_latency=0.1)
+            ).address
+            for _ in range(3)
+        ]
+        print("latency spikes")
+        for strategy, hedge in (("ewma", None), ("ewma", 90)):
+            run(spiky, n_requests, n_threads, strategy, hedge)
+        print("down replica")
+        for strategy, hedge in (("round_robin", None), ("ewma", 95)):
+            run(healthy + [closed_address()], n_requests, n_threads, strategy, hedge)
+        print("single gateway")
+        run(healthy[:1], n_requests, n_threads, "least_outstanding", None)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,49 @@
+"""Encode/decode cost and payload size of the timeseries wire encodings.
+
+python -m benchmarks.bench_codec [n_rows ...]
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from qshed.client import codecs
+
+
+def make_frame(n_rows: int) -> pd.DataFrame:
+    index = pd.date_range("2020-01-01", periods=n_rows, freq="s", tz="UTC")
+    return pd.DataFrame(
+        {
+            "value": np.random.default_rng(0).random(n_rows),
+            "count": np.arange(n_rows, dtype="int32"),
+        },
+        index=index,
+    )
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    rtn = func(*args)
+    return rtn, time.perf_counter() - start
+
+
+def main(*sizes: int):
+    sizes = sizes or (1_000, 100_000, 10_000_000)
+    print(
+        f"{'rows':>10} {'encoding':>10} {'encode s':>10} {'decode s':>10} {'bytes':>12}"
+    )
+    for n_rows in sizes:
+        df = make_frame(n_rows)
+        for encoding in reversed(codecs.available_encodings()):
+            payload, encode_s = timed(codecs.encode_frame, df, encoding)
+            _, decode_s = timed(codecs.decode_frame, payload)
+            size = len(payload if isinstance(payload, str) else payload["data"])
+            print(
+                f"{n_rows:>10} {encoding:>10} {encode_s:>10.4f} {decode_s:>10.4f} {size:>12}"
+            )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
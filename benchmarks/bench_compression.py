@@ -0,0 +1,36 @@
+"""Wire bytes and time for entity reads and writes with and without compression.
+
+python -m benchmarks.bench_compression [n_entities] [repeats]
+"""
+
+import sys
+import time
+
+from qshed.client import config
+from qshed.client.client import QShedClient
+from benchmarks.stub_gateway import StubGateway
+
+
+def main(n: int = 5000, repeats: int = 20):
+    config["caching"]["enabled"] = False
+    entities = [{"id": i, "name": f"entity-{i}", "type": "sensor"} for i in range(n)]
+    print(f"{'compression':>12} {'bytes in':>12} {'bytes out':>12} {'seconds':>10}")
+    for enabled in (False, True):
+        config["compression"]["enabled"] = enabled
+        # The stub decodes compressed request bodies
+        config["compression"]["request_encoding"] = "gzip" if enabled else None
+        with StubGateway() as gateway, QShedClient(gateway.address) as client:
+            start = time.perf_counter()
+            for _ in range(repeats):
+                client.entity.get(*range(n))
+                client.comms.post("entity/create_many", data=entities)
+            elapsed = time.perf_counter() - start
+            server = gateway.server
+            print(
+                f"{str(enabled):>12} {server.bytes_in:>12} {server.bytes_out:>12} "
+                f"{elapsed:>10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,70 @@
+"""DataModel lookups and record validation.
+
+Times repeated model lookups through the registry against building the class
+from a fetched definition each time, and validating records column by column
+with validate_frame against one pydantic model per row.
+
+    python -m benchmarks.bench_datamodel [n_records] [n_sample]
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from qshed.client import QShedClient
+from qshed.client.models.data import DataModel
+
+from .stub_gateway import StubGateway
+
+Sensor = DataModel.create_definition("Sensor", label=str, value=float, count=int)
+
+
+def make_records(n_records: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "entity_id": rng.integers(0, 1000, n_records),
+            "label": rng.choice(["north", "south", "east", "west"], n_records),
+            "value": rng.random(n_records),
+            "count": rng.integers(0, 100, n_records),
+        }
+    )
+
+
+def timed(func, repeat: int = 1):
+    t = time.perf_counter()
+    for _ in range(repeat):
+        rtn = func()
+    return rtn, (time.perf_counter() - t) / repeat
+
+
+def main(n_records: int = 1_000_000, n_sample: int = 20_000):
+    with StubGateway() as gateway, QShedClient(gateway.address) as client:
+        client.datamodel.save_definition("sensor", Sensor)
+
+        def rebuild():
+            return client.datamodel.get_definition("sensor").to_model()
+
+        _, rebuild_s = timed(rebuild, 100)
+        client.datamodel.model("sensor")
+        _, registry_s = timed(lambda: client.datamodel.model("sensor"), 100)
+        print(f"model lookup: fetch+build {rebuild_s * 1e3:.2f} ms, ", end="")
+        print(f"registry {registry_s * 1e6:.1f} us")
+
+        model = client.datamodel.model("sensor")
+        df = make_records(n_records)
+        _, frame_s = timed(lambda: model.validate_frame(df))
+        records = df.head(n_sample).to_dict("records")
+        _, rows_s = timed(lambda: [model.parse_obj(r) for r in records])
+        per_row = rows_s / n_sample
+        print(f"{n_records} records: validate_frame {frame_s:.2f} s")
+        print(
+            f"per-row pydantic: {per_row * 1e6:.1f} us/record, "
+            f"{per_row * n_records:.1f} s projected for {n_records}"
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,73 @@
+"""Response decode and request encode cost across JSON backends and modes.
+
+Compares the stdlib decoder with full validation against orjson with full
+validation and orjson with trusted (construct) models, for list responses of
+increasing size.
+
+    python -m benchmarks.bench_decode [n_items ...]
+"""
+
+import json
+import sys
+import time
+
+from qshed.client import config, utils
+from qshed.client.models import response as responseModels
+
+
+def make_collections(n_items: int) -> str:
+    return json.dumps(
+        {
+            "data": [
+                {
+                    "id": i,
+                    "name": f"collection-{i}",
+                    "database": i % 7,
+                    "entity": i,
+                    "data": [{"reading": j * 0.5, "tag": f"t{j}"} for j in range(10)],
+                    "query": {"tag": "t1"},
+                    "limit": 10,
+                }
+                for i in range(n_items)
+            ],
+            "error": None,
+        }
+    )
+
+
+def best_of(func, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def use_backend(backend: str) -> None:
+    config["json"]["backend"] = backend
+    utils._orjson.cache_clear()
+
+
+def main(*sizes: int):
+    sizes = sizes or (10, 1_000, 10_000)
+    response_type = responseModels.CollectionListResponse
+    print(f"{'items':>8} {'mode':>16} {'decode s':>10} {'encode s':>10}")
+    for n_items in sizes:
+        payload = make_collections(n_items)
+        documents = json.loads(payload)["data"]
+        for label, backend, trusted in (
+            ("json", "json", False),
+            ("orjson", "auto", False),
+            ("orjson+trusted", "auto", True),
+        ):
+            use_backend(backend)
+            decode_s = best_of(
+                lambda: utils.parse_response(response_type, payload, trusted)
+            )
+            encode_s = best_of(lambda: utils.json_dumps(documents))
+            print(f"{n_items:>8} {label:>16} {decode_s:>10.4f} {encode_s:>10.4f}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,43 @@
+"""Import cost of qshed.client, measured with `python -X importtime`.
+
+Exits non-zero if the import exceeds the budget or pulls in a module that
+should only load on first use.
+
+    python -m benchmarks.bench_import [budget_ms] [runs]
+"""
+
+import re
+import subprocess
+import sys
+
+BUDGET_MS = 250
+DEFERRED_MODULES = ("pandas", "numpy", "pyarrow", "yaml")
+
+
+def import_time_us() -> int:
+    check = (
+        "import sys, qshed.client; "
+        f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    loaded = proc.stdout.strip()
+    if loaded:
+        raise SystemExit(f"Importing qshed.client loaded deferred modules: {loaded}")
+    match = re.search(r"\|\s*(\d+) \| qshed\.client$", proc.stderr, re.MULTILINE)
+    return int(match.group(1))
+
+
+def main(budget_ms: float = BUDGET_MS, runs: int = 5):
+    best_ms = min(import_time_us() for _ in range(int(runs))) / 1000
+    print(f"import qshed.client: {best_ms:.1f} ms (budget {budget_ms} ms)")
+    if best_ms > budget_ms:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main(*map(float, sys.argv[1:]))
@@ -0,0 +1,73 @@
+"""Memory held by a decoded TimeseriesListResponse, measured with tracemalloc.
+
+Compares plain DataFrames against compact column arrays, with and without
+downcasting, for many short series.
+
+    python -m benchmarks.bench_memory [n_series] [n_rows]
+"""
+
+import gc
+import json
+import sys
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from qshed.client import codecs, config
+from qshed.client.models import response as responseModels
+
+
+def make_payload(n_series: int, n_rows: int) -> str:
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2020-01-01", periods=n_rows, freq="min", tz="UTC")
+    data = []
+    for i in range(n_series):
+        df = pd.DataFrame(
+            {
+                "value": rng.random(n_rows),
+                "count": rng.integers(0, 100, n_rows),
+                "state": rng.choice(["ok", "warn", "fault"], n_rows),
+            },
+            index=index,
+        )
+        data.append(
+            {
+                "id": i,
+                "name": f"series-{i}",
+                "entity": i,
+                "data": codecs.encode_frame(df),
+            }
+        )
+    return json.dumps({"data": data, "error": None})
+
+
+def measure(payload: str):
+    gc.collect()
+    tracemalloc.start()
+    series = responseModels.TimeseriesListResponse.parse_raw(payload).data
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return series, current, peak
+
+
+def main(n_series: int = 1000, n_rows: int = 100):
+    payload = make_payload(n_series, n_rows)
+    compact_config = config["timeseries"]["compact"]
+    print(f"{n_series} series x {n_rows} rows, payload {len(payload)} bytes")
+    print(f"{'mode':>18} {'held MB':>10} {'peak MB':>10}")
+    for label, enabled, downcast in (
+        ("DataFrame", False, False),
+        ("compact", True, False),
+        ("compact+downcast", True, True),
+    ):
+        compact_config["enabled"] = enabled
+        compact_config["downcast"] = downcast
+        series, current, peak = measure(payload)
+        print(f"{label:>18} {current / 2**20:>10.1f} {peak / 2**20:>10.1f}")
+        del series
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,45 @@
+"""TimeseriesListResponse decode time, serial vs thread and process pools.
+
+Decodes one list response of many zlib-json series serially and on pools of
+1, 2, 4, ... workers up to the CPU count, to show how decoding scales with
+cores. Pools are warmed up before timing.
+
+    python -m benchmarks.bench_parallel_decode [n_series] [n_rows]
+"""
+
+import os
+import sys
+
+from qshed.client import codecs, config
+from qshed.client.models import response as responseModels
+from qshed.client.models.timeseries import decode_pool, shutdown_decode_pools
+
+from .suite import best_of, timeseries_payload
+
+
+def main(n_series: int = 400, n_rows: int = 2000):
+    payload = timeseries_payload(n_series, n_rows, codecs.ZLIB_JSON)
+    response_type = responseModels.TimeseriesListResponse
+    decode_config = config["timeseries"]["decode"]
+    decode_config["min_bytes"] = 0
+    cpus = os.cpu_count()
+    counts = [n for n in (1, 2, 4, 8, 16, 32, 64) if n < cpus] + [cpus]
+    print(f"{n_series} series x {n_rows} rows, {len(payload)} bytes, {cpus} CPUs")
+    print(f"{'mode':>8} {'workers':>8} {'seconds':>8} {'speedup':>8}")
+
+    decode_config["parallel"] = None
+    serial = best_of(lambda: response_type.parse_raw(payload), 3)
+    print(f"{'serial':>8} {1:>8} {serial:>8.3f} {1:>8.2f}")
+    for kind in ("thread", "process"):
+        for workers in counts:
+            decode_config["parallel"] = kind
+            decode_config["workers"] = workers
+            # Start the workers (and their imports) before timing
+            list(decode_pool(kind, workers).map(abs, range(workers)))
+            seconds = best_of(lambda: response_type.parse_raw(payload), 3)
+            print(f"{kind:>8} {workers:>8} {seconds:>8.3f} {serial / seconds:>8.2f}")
+            shutdown_decode_pools()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,113 @@
+"""Freshness latency and gateway traffic: subscribe vs polling a window.
+
+A publisher writes one-row timeseries deltas to the stub gateway. The
+subscriber receives them over server-sent events, with the stream cut midway
+to exercise resume. The poller re-downloads the whole series every
+`poll_interval` seconds.
+
+    python -m benchmarks.bench_subscribe [n_events] [interval] [poll_interval]
+"""
+
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from qshed.client import config
+from qshed.client.client import QShedClient
+from qshed.client.models import data as dataModels
+from qshed.client.utils import json_loads
+from benchmarks.stub_gateway import StubGateway
+
+
+def make_delta(seq: int) -> str:
+    df = pd.DataFrame({"seq": [seq]}, index=[pd.Timestamp.now()])
+    return dataModels.Timeseries(name="live", entity=1, id=1, data=df).json()
+
+
+def publish(gateway, n_events: int, interval: float, published: dict) -> None:
+    for seq in range(n_events):
+        body = make_delta(seq)
+        published[seq] = time.perf_counter()
+        gateway.publish("timeseries", 1, body)
+        if seq == n_events // 2:
+            gateway.drop_subscribers()
+        time.sleep(interval)
+
+
+def report(label, received, published, requests, nbytes):
+    latencies = sorted(received[seq] - published[seq] for seq in received)
+    mean = sum(latencies) / len(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f"{label:>10} {len(received):>8} {mean * 1000:>10.1f} {p99 * 1000:>10.1f} "
+        f"{requests:>9} {nbytes:>10}"
+    )
+
+
+def run_subscribe(n_events: int, interval: float) -> None:
+    config["subscribe"]["retry"] = 0.05
+    published, received, seen = {}, {}, []
+    with StubGateway() as gateway, QShedClient(gateway.address) as client:
+        subscription = client.subscribe(timeseries_ids=[1])
+
+        def consume():
+            for delta in subscription:
+                for seq in delta.data["seq"]:
+                    received.setdefault(seq, time.perf_counter())
+                    seen.append(seq)
+                if len(received) == n_events:
+                    subscription.close()
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        time.sleep(0.2)
+        publish(gateway, n_events, interval, published)
+        consumer.join(timeout=30)
+        subscription.close()
+        assert seen == list(range(n_events)), "deltas lost or repeated"
+        report(
+            "subscribe",
+            received,
+            published,
+            subscription.reconnects + 1,
+            gateway.server.bytes_out,
+        )
+
+
+def run_poll(n_events: int, interval: float, poll_interval: float) -> None:
+    config["caching"]["enabled"] = False
+    published, received = {}, {}
+    requests = 0
+    with StubGateway() as gateway, QShedClient(gateway.address) as client:
+        publisher = threading.Thread(
+            target=publish, args=(gateway, n_events, interval, published)
+        )
+        publisher.start()
+        while len(received) < n_events:
+            time.sleep(poll_interval)
+            rtn = client.comms.get("events", params={"kind": "timeseries", "id": 1})
+            requests += 1
+            now = time.perf_counter()
+            # Only the new tail is decoded, to time the transfer not the parsing
+            for body in json_loads(rtn)["data"][len(received) :]:
+                for seq in dataModels.Timeseries.parse_raw(body).data["seq"]:
+                    received.setdefault(seq, now)
+        publisher.join()
+        report("poll", received, published, requests, gateway.server.bytes_out)
+
+
+def main(n_events: int = 500, interval: float = 0.01, poll_interval: float = 0.25):
+    # The stub does not compress event streams, so compare uncompressed bytes
+    config["compression"]["enabled"] = False
+    print(
+        f"{'mode':>10} {'events':>8} {'mean ms':>10} {'p99 ms':>10} "
+        f"{'requests':>9} {'bytes':>10}"
+    )
+    run_subscribe(n_events, interval)
+    run_poll(n_events, interval, poll_interval)
+
+
+if __name__ == "__main__":
+    main(*(float(arg) if "." in arg else int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,35 @@
+"""Requests/sec against a local stub gateway: bare requests.get vs pooled Comms.
+
+python -m benchmarks.bench_transport [n_requests]
+"""
+
+import sys
+import time
+
+import requests
+
+from qshed.client import config
+from qshed.client.client import Comms
+from benchmarks.stub_gateway import StubGateway
+
+
+def run(label, func, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {n / elapsed:>10.1f} req/s")
+
+
+def main(n: int = 2000):
+    config["caching"]["enabled"] = False
+    with StubGateway() as gateway:
+        url = gateway.address + "ping"
+        run("requests.get (before)", lambda: requests.get(url), n)
+        comms = Comms(gateway.address)
+        run("Comms.get (pooled)", lambda: comms.get("ping"), n)
+        comms.close()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,342 @@
+"""An in-process stand-in for the QShed gateway, for tests and benchmarks.
+
+Serves the entity/, timeseries/, collection/ and datamodel/ endpoints the
+client uses. Objects created through the client are kept and served back;
+any other id is answered with synthetic data sized by `n_rows` and
+`n_columns` (timeseries) or `n_documents` (collections). `latency` seconds are
+added to every request to stand in for the network and the gateway's work,
+and a `spike_rate` fraction of requests take `spike_latency` instead.
+
+    with StubGateway(latency=0.002, n_rows=1000) as gateway:
+        client = QShedClient(gateway.address)
+"""
+
+import gzip
+import hashlib
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import pandas as pd
+
+from qshed.client import codecs
+from qshed.client.aggregate import aggregate
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionError:
+            # The client cut the request short, as a won hedge does
+            pass
+
+    def send_body(self, body: bytes, status: int = 200):
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        path = urlparse(self.path).path.strip("/")
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            self.server.gateway.responses[path, 304] += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.server.gateway.responses[path, status] += 1
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", etag)
+        if "gzip" in self.headers.get("Accept-Encoding", "") and len(body) >= 1024:
+            body = gzip.compress(body, compresslevel=6)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.bytes_out += len(body)
+
+    def send_data(self, data) -> None:
+        self.send_body(json.dumps({"data": data, "error": None}).encode())
+
+    def send_error_data(self, code: int, message: str) -> None:
+        error = {"code": code, "message": message}
+        self.send_body(json.dumps({"data": None, "error": error}).encode(), code)
+
+    def read_body(self) -> bytes:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.bytes_in += len(body)
+        encoding = self.headers.get("Content-Encoding")
+        if encoding == "gzip":
+            return gzip.decompress(body)
+        if encoding == "zstd":
+            import zstandard
+
+            return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+        return body
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path.strip("/")
+        query = parse_qs(url.query)
+        gateway = self.server.gateway
+        if path == "subscribe":
+            return self.stream_events(query)
+        gateway.delay()
+        if path == "ping":
+            return self.send_body(b'"ok"')
+        if path == "entity/get":
+            return self.send_data([gateway.entity(int(id)) for id in query["id"]])
+        if path == "entity/get_roots":
+            return self.send_data(list(gateway.entities.values()))
+        if path == "timeseries/get":
+            encodings = self.headers.get(codecs.ENCODING_HEADER, codecs.ZLIB_JSON)
+            encoding = encodings.split(",")[0].strip()
+            return self.send_data(
+                [gateway.timeseries(int(id), query, encoding) for id in query["id"]]
+            )
+        if path == "collection/get":
+            return self.send_data(
+                [gateway.collection(int(id), query) for id in query["id"]]
+            )
+        if path == "collection/database/get":
+            return self.send_data([gateway.database(int(id)) for id in query["id"]])
+        if path.startswith("datamodel/"):
+            if path not in gateway.definitions:
+                return self.send_error_data(404, f"No data model at {path}")
+            return self.send_data(gateway.definitions[path])
+        if path == "events":
+            # Everything published for one series: what polling re-downloads
+            kind, id = query["kind"][0], int(query["id"][0])
+            data = [body for k, i, body in self.server.events if (k, i) == (kind, id)]
+            return self.send_data(data)
+        self.send_error_data(404, path)
+
+    def write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.server.bytes_out += len(data)
+
+    def stream_events(self, query):
+        server = self.server
+        wanted = {("timeseries", int(id)) for id in query.get("timeseries", [])}
+        wanted |= {("collection", int(id)) for id in query.get("collection", [])}
+        # Event ids are positions in the published log
+        sent = int(self.headers.get("Last-Event-ID", 0))
+        generation = server.generation
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            while True:
+                with server.published:
+                    server.published.wait_for(
+                        lambda: len(server.events) > sent
+                        or server.generation != generation,
+                        timeout=server.keepalive,
+                    )
+                    pending = server.events[sent:]
+                if server.generation != generation:
+                    # Dropped without the terminating chunk, like a lost connection
+                    return
+                if not pending:
+                    self.write_chunk(b":\n\n")
+                    continue
+                lines = []
+                for n, (kind, id, body) in enumerate(pending, start=sent + 1):
+                    if (kind, id) in wanted:
+                        lines.append(f"id: {n}\nevent: {kind}\ndata: {body}\n\n")
+                sent += len(pending)
+                if lines:
+                    self.write_chunk("".join(lines).encode())
+        except OSError:
+            pass
+
+    def do_POST(self):
+        body = self.read_body()
+        path = urlparse(self.path).path.strip("/")
+        gateway = self.server.gateway
+        gateway.delay()
+        if path == "entity/create_many":
+            data = [gateway.create("entity", entity) for entity in json.loads(body)]
+            return self.send_data(data)
+        if path in ("entity/create", "collection/create", "timeseries/create"):
+            kind = path.split("/")[0]
+            return self.send_data(gateway.create(kind, json.loads(body)))
+        if path == "collection/database/create":
+            return self.send_data(gateway.create("database", json.loads(body)))
+        if path == "timeseries/add":
+            return self.send_data(gateway.add_timeseries(json.loads(body)))
+        if path.startswith("datamodel/"):
+            gateway.definitions[path] = json.loads(body)
+        self.send_body(b'"ok"')
+
+
+class StubGateway:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        n_rows: int = 100,
+        n_columns: int = 3,
+        n_documents: int = 10,
+        spike_rate: float = 0.0,
+        spike_latency: float = 0.0,
+    ) -> None:
+        self.latency = latency
+        self.spike_rate = spike_rate
+        self.spike_latency = spike_latency
+        self.n_rows = n_rows
+        self.n_columns = n_columns
+        self.n_documents = n_documents
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1_000_000)
+        # Objects created through the client, by kind and id
+        self.stored = {"entity": {}, "timeseries": {}, "collection": {}, "database": {}}
+        # DataModel definitions saved by path
+        self.definitions = {}
+        # Synthetic series are generated and encoded once per query
+        self.encoded = {}
+        # Responses sent, by (path, status)
+        self.responses = Counter()
+        self.server = ThreadingHTTPServer((host, port), StubHandler)
+        self.server.daemon_threads = True
+        self.server.gateway = self
+        # Body bytes as sent over the wire, i.e. after any compression
+        self.server.bytes_in = self.server.bytes_out = 0
+        # Published (kind, id, body) events streamed to subscribers
+        self.server.events = []
+        self.server.published = threading.Condition()
+        self.server.generation = 0
+        self.server.keepalive = 15
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    @property
+    def entities(self) -> dict:
+        return self.stored["entity"]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def delay(self) -> None:
+        latency = self.latency
+        if self.spike_rate and random.random() < self.spike_rate:
+            latency = self.spike_latency
+        if latency:
+            time.sleep(latency)
+
+    def create(self, kind: str, obj: dict) -> dict:
+        with self.lock:
+            obj["id"] = next(self.ids)
+            self.stored[kind][obj["id"]] = obj
+            database = self.stored["database"].get(obj.get("database"))
+            if kind == "collection" and database is not None:
+                database["collections"].append(obj["id"])
+        return obj
+
+    def entity(self, id: int) -> dict:
+        return self.stored["entity"].get(id, {"id": id})
+
+    def database(self, id: int) -> dict:
+        default = {"id": id, "name": f"database-{id}", "collections": []}
+        return self.stored["database"].get(id, default)
+
+    def frame(self, id: int, start: float, end: float) -> pd.DataFrame:
+        rng = np.random.default_rng(id)
+        seconds = np.linspace(start, end, self.n_rows).astype("int64")
+        return pd.DataFrame(
+            rng.random((self.n_rows, self.n_columns)),
+            index=pd.to_datetime(seconds, unit="s"),
+            columns=[f"value_{n}" for n in range(self.n_columns)],
+        )
+
+    def timeseries(self, id: int, query: dict, encoding: str) -> dict:
+        if id in self.stored["timeseries"]:
+            return self.stored["timeseries"][id]
+        key = (id, encoding, tuple(sorted((k, tuple(v)) for k, v in query.items())))
+        if key not in self.encoded:
+            df = self.frame(id, float(query["start"][0]), float(query["end"][0]))
+            columns = query["columns"][0].split(",") if "columns" in query else None
+            if "resample" in query:
+                resample = float(query["resample"][0])
+                df = aggregate(df, resample, query["agg"][0], columns)
+            elif columns is not None:
+                df = df[columns]
+            self.encoded[key] = {
+                "id": id,
+                "name": f"series-{id}",
+                "entity": id,
+                "data": codecs.encode_frame(df, encoding),
+            }
+        return self.encoded[key]
+
+    def add_timeseries(self, obj: dict) -> dict:
+        with self.lock:
+            stored = self.stored["timeseries"].get(obj.get("id"))
+            if stored is not None:
+                frames = [stored["data"], obj["data"]]
+                frames = [codecs.decode_frame(frame) for frame in frames]
+                stored["data"] = codecs.encode_frame(pd.concat(frames))
+                return stored
+        return self.create("timeseries", obj)
+
+    def collection(self, id: int, query: dict) -> dict:
+        skip = int(query.get("skip", [0])[0])
+        limit = int(query.get("limit", [10])[0])
+        if id in self.stored["collection"]:
+            collection = dict(self.stored["collection"][id])
+            documents = collection.get("data") or []
+        else:
+            collection = {
+                "id": id,
+                "name": f"collection-{id}",
+                "database": 1,
+                "entity": id,
+            }
+            documents = [
+                {"reading": n * 0.5, "tag": f"t{n % 10}", "site": {"id": n % 3}}
+                for n in range(self.n_documents)
+            ]
+        documents = documents[skip : skip + limit]
+        if "projection" in query:
+            fields = query["projection"][0].split(",")
+            documents = [{f: d[f] for f in fields if f in d} for d in documents]
+        collection["data"] = documents
+        # Echo the offset applied, as the gateway does
+        collection["skip"] = skip
+        return collection
+
+    def publish(self, kind: str, id: int, body: str) -> None:
+        """Push a timeseries/collection delta (JSON text) to subscribers."""
+        with self.server.published:
+            self.server.events.append((kind, id, body))
+            self.server.published.notify_all()
+
+    def drop_subscribers(self) -> None:
+        """Cut every open subscription stream mid-flight."""
+        with self.server.published:
+            self.server.generation += 1
+            self.server.published.notify_all()
+
+    def __exit__(self, *exc_info) -> None:
+        self.drop_subscribers()
+        self.server.shutdown()
+        self.server.server_close()
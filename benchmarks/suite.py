@@ -0,0 +1,222 @@
+"""Client performance suite, checked against committed baseline numbers.
+
+Covers request throughput against the stub gateway (sequential, and
+concurrent with injected latency), TimeseriesListResponse decode cost per
+encoding, response cache hit paths (memory and disk tier), decode memory, and
+an end-to-end timeseries read. Each result is compared with
+benchmarks/baseline.json and reported as a regression when it is worse by
+more than the tolerance; the exit status is 1 if any are.
+
+    python -m benchmarks.suite               # compare with the baseline
+    python -m benchmarks.suite --save        # record a new baseline
+    python -m benchmarks.suite -k cache      # only benchmarks matching "cache"
+
+Timings are the best of several runs. Baselines are machine specific; record
+one on the machine that checks for regressions.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from qshed.client import QShedClient, codecs, config
+from qshed.client.cache import ResponseCache
+from qshed.client.models import response as responseModels
+
+from .stub_gateway import StubGateway
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# name -> (function, unit, whether higher is better)
+BENCHMARKS = {}
+
+
+def benchmark(name: str, unit: str, higher_is_better: bool = False):
+    def register(func):
+        BENCHMARKS[name] = (func, unit, higher_is_better)
+        return func
+
+    return register
+
+
+def best_of(func, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+@contextmanager
+def configured(section: str, **values):
+    """Override config[section] values for the duration of the block."""
+    section_config = config[section]
+    saved = {key: section_config[key] for key in values}
+    section_config.update(values)
+    try:
+        yield
+    finally:
+        section_config.update(saved)
+
+
+@contextmanager
+def client(caching: bool = False, **stub_options):
+    with configured("caching", enabled=caching), StubGateway(**stub_options) as stub:
+        with QShedClient(stub.address) as rtn:
+            yield rtn
+
+
+def timeseries_payload(n_series: int, n_rows: int, encoding: str) -> str:
+    stub = StubGateway(n_rows=n_rows)
+    query = {"start": ["1577836800"], "end": ["1580515200"]}
+    data = [stub.timeseries(id, query, encoding) for id in range(n_series)]
+    stub.server.server_close()
+    return json.dumps({"data": data, "error": None})
+
+
+@benchmark("throughput.entity_get", "req/s", higher_is_better=True)
+def entity_get_throughput(n: int = 1000) -> float:
+    with client() as c:
+        return n / best_of(lambda: [c.entity.get(1) for _ in range(n)], 3)
+
+
+@benchmark("throughput.entity_get_concurrent", "req/s", higher_is_better=True)
+def entity_get_concurrent(n: int = 400, threads: int = 8) -> float:
+    # 5 ms injected latency: concurrency should overlap the waits
+    with client(latency=0.005) as c, ThreadPoolExecutor(threads) as executor:
+        return n / best_of(lambda: list(executor.map(c.entity.get, range(n))), 3)
+
+
+def decode_timeseries_list(encoding: str) -> float:
+    payload = timeseries_payload(100, 1000, encoding)
+    response_type = responseModels.TimeseriesListResponse
+    return best_of(lambda: response_type.parse_raw(payload))
+
+
+@benchmark("decode.timeseries_list.zlib_json", "s")
+def decode_zlib_json() -> float:
+    return decode_timeseries_list(codecs.ZLIB_JSON)
+
+
+@benchmark("decode.timeseries_list.json", "s")
+def decode_json() -> float:
+    return decode_timeseries_list(codecs.JSON)
+
+
+@benchmark("decode.timeseries_list.arrow", "s")
+def decode_arrow() -> float:
+    return decode_timeseries_list(codecs.ARROW)
+
+
+@benchmark("cache.memory_hit", "us")
+def cache_memory_hit(n: int = 2000) -> float:
+    with client(caching=True) as c:
+        c.entity.get(*range(100))
+        return best_of(lambda: [c.entity.get(*range(100)) for _ in range(n)]) / n * 1e6
+
+
+@benchmark("cache.disk_hit", "us")
+def cache_disk_hit(n: int = 500) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        disk = {"enabled": True, "dir": directory, "max_bytes": 2**28}
+        with configured("caching", disk=disk), client(caching=True) as c:
+            c.entity.get(*range(100))
+            backing = c.comms.cache.backing
+
+            def hits():
+                for _ in range(n):
+                    # An empty memory tier, as in a newly started process
+                    c.comms.cache = ResponseCache(60, backing=backing)
+                    c.entity.get(*range(100))
+
+            return best_of(hits) / n * 1e6
+
+
+@benchmark("memory.timeseries_list_peak", "MB")
+def timeseries_list_peak() -> float:
+    payload = timeseries_payload(1000, 100, codecs.ZLIB_JSON)
+    gc.collect()
+    tracemalloc.start()
+    series = responseModels.TimeseriesListResponse.parse_raw(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del series
+    return peak / 2**20
+
+
+@benchmark("e2e.timeseries_get", "s")
+def timeseries_get() -> float:
+    end = datetime(2020, 2, 1)
+    start = end - timedelta(days=31)
+    with client(n_rows=10_000) as c:
+        return best_of(lambda: c.timeseries.get(*range(10), start=start, end=end))
+
+
+def machine() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def regressed(current: float, baseline: float, higher_is_better: bool, tolerance):
+    if higher_is_better:
+        return current < baseline * (1 - tolerance)
+    return current > baseline * (1 + tolerance)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--save", action="store_true", help="write the baseline")
+    parser.add_argument("-k", default="", help="only run names containing this")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    parser.add_argument("--baseline", default=BASELINE)
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    failures = []
+    print(f"{'benchmark':<36} {'result':>12} {'baseline':>12} {'change':>8}")
+    for name, (func, unit, higher_is_better) in BENCHMARKS.items():
+        if args.k not in name:
+            continue
+        results[name] = value = func()
+        line = f"{name:<36} {value:>9.3f} {unit:<3}"
+        if name in baseline:
+            base = baseline[name]
+            line += f"{base:>12.3f} {(value - base) / base:>+8.0%}"
+            if regressed(value, base, higher_is_better, args.tolerance):
+                failures.append(name)
+                line += "  REGRESSION"
+        print(line)
+
+    if args.save:
+        baseline.update({name: float(f"{v:.4g}") for name, v in results.items()})
+        with open(args.baseline, "w") as f:
+            json.dump({"machine": machine(), "results": baseline}, f, indent=2)
+            f.write("\n")
+        print(f"Saved {len(results)} results to {args.baseline}")
+        return 0
+    if failures:
+        print(f"{len(failures)} regressions beyond {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
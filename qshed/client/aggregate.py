@@ -0,0 +1,151 @@
+from datetime import timedelta
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+MEAN = "mean"
+MIN = "min"
+MAX = "max"
+LAST = "last"
+LTTB = "lttb"
+
+AGGREGATIONS = (MEAN, MIN, MAX, LAST, LTTB)
+
+
+def resample_seconds(resample: Union[str, float, timedelta]) -> float:
+    """Bin width in seconds, from seconds, a timedelta or a string like "5min"."""
+    if isinstance(resample, (int, float)):
+        return float(resample)
+    return pd.Timedelta(resample).total_seconds()
+
+
+def params(
+    resample=None, agg: Optional[str] = None, columns: Optional[List[str]] = None
+) -> dict:
+    """Gateway query parameters for an aggregated timeseries read."""
+    rtn = {}
+    if resample is not None:
+        rtn["resample"] = resample_seconds(resample)
+        rtn["agg"] = agg or MEAN
+    if columns is not None:
+        rtn["columns"] = ",".join(columns)
+    return rtn
+
+
+class Aggregator:
+    """Resample a series that arrives in time ordered chunks.
+
+    Rows are put in bins of `resample` width aligned to the epoch, labelled by
+    the bin start; empty bins are omitted. mean/min/max/last reduce each bin
+    to one row. lttb (largest triangle three buckets) needs a single column
+    and keeps one real point per bin: the one forming the largest triangle
+    with the point kept for the previous bin and the mean of the next bin. The
+    first bin keeps its first point and the last bin its last.
+
+    Rows of bins that may still receive data are held back, so feeding a frame
+    in any number of chunks gives exactly the same result as feeding it at once.
+    """
+
+    def __init__(self, resample, agg: str = MEAN, columns: List[str] = None) -> None:
+        if agg not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation: {agg}")
+        self.rule = pd.Timedelta(seconds=resample_seconds(resample))
+        self.agg = agg
+        self.columns = columns
+        self.held = None
+        # Last point kept by lttb, as (int64 time, value)
+        self.previous = None
+
+    def add(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Add the next chunk and return the bins it completed."""
+        df = self.select(df)
+        if self.held is not None:
+            df = pd.concat([self.held, df])
+        bins = df.index.floor(self.rule)
+        unique = bins.unique()
+        # lttb reduces a bin using the mean of the next one, so that must be
+        # complete too; the last bin may always receive more rows
+        held_bins = 2 if self.agg == LTTB else 1
+        if len(unique) <= held_bins:
+            self.held = df
+            return df.iloc[:0]
+        done = bins < unique[-held_bins]
+        self.held = df[~done]
+        if self.agg == LTTB:
+            lookahead = bins < unique[-1]
+            return self.lttb(df[lookahead], bins[lookahead], len(unique) - held_bins)
+        return self.reduce(df[done], bins[done])
+
+    def finish(self) -> pd.DataFrame:
+        """Return the bins still held back once all chunks have been added."""
+        df, self.held = self.held, None
+        if df is None or df.empty:
+            return pd.DataFrame() if df is None else df
+        bins = df.index.floor(self.rule)
+        if self.agg == LTTB:
+            return self.lttb(df, bins)
+        return self.reduce(df, bins)
+
+    def select(self, df: pd.DataFrame) -> pd.DataFrame:
+        if self.columns is not None:
+            df = df[self.columns]
+        if self.agg == LTTB:
+            if df.shape[1] != 1:
+                raise ValueError("lttb aggregation needs exactly one column")
+            df = df[df.iloc[:, 0].notna()]
+        return df
+
+    def reduce(self, df: pd.DataFrame, bins: pd.Index) -> pd.DataFrame:
+        rtn = df.groupby(bins).agg(self.agg)
+        rtn.index.name = df.index.name
+        return rtn
+
+    def lttb(
+        self, df: pd.DataFrame, bins: pd.Index, n_bins: Optional[int] = None
+    ) -> pd.DataFrame:
+        """Keep one point for each of the first `n_bins` bins (default all).
+
+        Bin extents and mean points are computed for all bins at once; only
+        the choice within each bin, which depends on the point kept for the
+        previous bin, is made bin by bin.
+        """
+        times = df.index.asi8
+        values = df.iloc[:, 0].to_numpy(dtype="float64")
+        starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+        ends = np.r_[starts[1:], len(df)]
+        # Times relative to their bin's start keep int64 precision
+        offsets = (times - bins.asi8).astype("float64")
+        mean_x = (np.add.reduceat(offsets, starts) / (ends - starts)).tolist()
+        mean_y = (np.add.reduceat(values, starts) / (ends - starts)).tolist()
+        bin_starts = bins.asi8[starts].tolist()
+        starts, ends = starts.tolist(), ends.tolist()
+        final = n_bins is None
+        if final:
+            n_bins = len(starts)
+        selected = np.empty(n_bins, dtype=np.intp)
+        for n in range(n_bins):
+            start, end = starts[n], ends[n]
+            if self.previous is None:
+                pick = start
+            elif final and n == n_bins - 1:
+                pick = end - 1
+            else:
+                # Triangle (a, b, c) with a the previous point, c the next bin's
+                # mean and times relative to a
+                ax, ay = self.previous
+                cx = bin_starts[n + 1] - ax + mean_x[n + 1]
+                dy = mean_y[n + 1] - ay
+                shift = (bin_starts[n] - ax) * dy + cx * ay
+                area = np.abs(offsets[start:end] * dy - values[start:end] * cx + shift)
+                pick = start + int(np.argmax(area))
+            selected[n] = pick
+            self.previous = (int(times[pick]), float(values[pick]))
+        return df.iloc[selected]
+
+
+def aggregate(
+    df: pd.DataFrame, resample, agg: str = MEAN, columns: List[str] = None
+) -> pd.DataFrame:
+    aggregator = Aggregator(resample, agg, columns)
+    return pd.concat([aggregator.add(df), aggregator.finish()])
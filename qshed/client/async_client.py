@@ -0,0 +1,406 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from datetime import datetime, timedelta
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Dict,
+    List,
+    Optional,
+    Union,
+)
+
+import httpx
+
+from . import config
+from . import codecs
+from . import compression
+from .client import (
+    BaseComms,
+    BaseModule,
+    GatewayModule,
+    EntityModule,
+    TimeseriesModule,
+    CollectionModule,
+    DataModelModule,
+    Pager,
+)
+from .models import data as dataModels
+from .models import response as responseModels
+from .stream import aiter_response_data
+from .utils import aread_ahead, json_dumps, time_windows
+from .writer import AsyncBulkWriter
+
+
+class AsyncComms(BaseComms):
+    def __init__(self, address: str, trusted: bool = False) -> None:
+        if not address.endswith("/"):
+            address += "/"
+        self.address = address
+        self.trusted = trusted
+        self.headers = {"Content-Type": "application/json"}
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.client = self.create_client()
+        self.metrics = self.create_metrics()
+
+    @staticmethod
+    def create_client() -> httpx.AsyncClient:
+        transport_config = config["transport"]
+        timeout = httpx.Timeout(
+            transport_config["timeout"]["read"],
+            connect=transport_config["timeout"]["connect"],
+        )
+        limits = httpx.Limits(
+            max_connections=transport_config["pool_maxsize"],
+            max_keepalive_connections=transport_config["pool_maxsize"],
+        )
+        # httpx only retries failed connection attempts, which are always safe
+        transport = httpx.AsyncHTTPTransport(
+            limits=limits, retries=transport_config["retries"]["total"]
+        )
+        headers = {codecs.ENCODING_HEADER: ", ".join(codecs.available_encodings())}
+        client = httpx.AsyncClient(
+            timeout=timeout, transport=transport, headers=headers
+        )
+        client.headers["Accept-Encoding"] = compression.accept_encoding(
+            client.headers["Accept-Encoding"]
+        )
+        return client
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    async def get(self, url_ext: str, params: dict = {}):
+        with self.measure(url_ext):
+            resp = await self.client.get(self.address + url_ext, params=params)
+        self.log_response(url_ext, resp)
+
+        if resp.is_success:
+            return resp.text
+        else:
+            raise Exception(f"Error {resp.status_code}: {resp.text}")
+
+    async def stream_get(self, url_ext: str, params: dict = {}) -> AsyncIterator[str]:
+        """GET `url_ext`, yielding the body as text chunks as they arrive."""
+        with self.measure(url_ext):
+            async with self.client.stream(
+                "GET", self.address + url_ext, params=params
+            ) as resp:
+                if not resp.is_success:
+                    await resp.aread()
+                    raise Exception(f"Error {resp.status_code}: {resp.text}")
+                async for chunk in resp.aiter_text():
+                    yield chunk
+
+    async def post(self, url_ext: str, params: dict = {}, data: str = ""):
+        if not isinstance(data, str):
+            data = json_dumps(data)
+        body, headers = self.encode_body(data)
+        with self.measure(url_ext, len(body)):
+            resp = await self.client.post(
+                self.address + url_ext,
+                content=body,
+                params=params,
+                headers=headers,
+            )
+        self.log_response(url_ext, resp)
+
+        if resp.is_success:
+            return resp.text
+        else:
+            raise Exception(f"Error {resp.status_code}: {resp.content}")
+
+
+class AsyncEntityModule(EntityModule):
+    def __init__(self, comms: AsyncComms) -> None:
+        # The DataLoader batches across threads; async callers pass several ids to get
+        BaseModule.__init__(self, comms)
+
+    async def load(self, id: int) -> dataModels.Entity:
+        rtn = await self.get(id)
+        if isinstance(rtn, responseModels.Error):
+            raise Exception(f"Error {rtn.code}: {rtn.message}")
+        if not rtn:
+            raise Exception(f"Entity {id} not found")
+        return rtn[0]
+
+    async def iter(self, *ids: List[int]) -> AsyncIterator[dataModels.Entity]:
+        chunks = self.comms.stream_get("entity/get", params={"id": ids})
+        async for item in aiter_response_data(chunks):
+            yield self.parse_obj(dataModels.Entity, item)
+
+
+class AsyncTimeseriesModule(TimeseriesModule):
+    def bulk_writer(self, **kwargs) -> AsyncBulkWriter:
+        return AsyncBulkWriter(self, **kwargs)
+
+    async def get_chunk(self, id: int, start: datetime, end: datetime, **kwargs):
+        import pandas as pd
+
+        rtn = await self.get(id, start=start, end=end, **kwargs)
+        if isinstance(rtn, responseModels.Error):
+            raise Exception(f"Error {rtn.code}: {rtn.message}")
+        if not rtn:
+            return pd.DataFrame()
+        return rtn[0].data
+
+    async def get_frame(
+        self,
+        id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        resample: Optional[Union[str, float, timedelta]] = None,
+        agg: str = "mean",
+        columns: Optional[List[str]] = None,
+    ):
+        start, end = self.default_window(start, end)
+        if resample is not None or columns is not None:
+            return await self.get_aggregated(id, start, end, resample, agg, columns)
+        if self.store is None:
+            return await self.get_chunk(id, start, end)
+
+        for gap_start, gap_end in self.store.missing(id, start, end):
+            self.logger.debug(f"Fetching timeseries {id} gap {gap_start} - {gap_end}")
+            df = await self.get_chunk(id, gap_start, gap_end)
+            self.store.add(id, gap_start, gap_end, df)
+        return self.store.select(id, start, end)
+
+    async def get_aggregated(self, id, start, end, resample, agg, columns):
+        if config["timeseries"]["aggregation"] == "server":
+            return await self.get_chunk(
+                id, start, end, resample=resample, agg=agg, columns=columns
+            )
+
+        import pandas as pd
+        from .aggregate import Aggregator
+
+        frames = []
+        aggregator = None if resample is None else Aggregator(resample, agg, columns)
+        async for df in self.iter_chunks(id, start, end):
+            frames.append(df[columns] if aggregator is None else aggregator.add(df))
+        if aggregator is not None:
+            frames.append(aggregator.finish())
+        frames = [df for df in frames if not df.empty]
+        return pd.concat(frames) if frames else pd.DataFrame()
+
+    async def iter_chunks(
+        self,
+        id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        chunk: Optional[timedelta] = None,
+        prefetch: Optional[int] = None,
+    ):
+        start, end = self.default_window(start, end)
+        if chunk is None:
+            chunk = timedelta(days=config["timeseries"]["chunk_days"])
+        if prefetch is None:
+            prefetch = config["timeseries"]["prefetch"]
+
+        windows = time_windows(start, end, chunk)
+        pending = deque()
+        last_index = None
+
+        def submit_next():
+            window = next(windows, None)
+            if window is not None:
+                pending.append(asyncio.ensure_future(self.get_chunk(id, *window)))
+
+        try:
+            for _ in range(prefetch + 1):
+                submit_next()
+            while pending:
+                df = await pending.popleft()
+                submit_next()
+                # Windows share their boundary instant; drop the repeated rows
+                if last_index is not None and not df.empty:
+                    df = df[df.index > last_index]
+                if df.empty:
+                    continue
+                last_index = df.index[-1]
+                yield df
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def get_chunked(
+        self,
+        id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        chunk: Optional[timedelta] = None,
+        prefetch: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+    ):
+        import pandas as pd
+
+        chunks = self.iter_chunks(id, start, end, chunk=chunk, prefetch=prefetch)
+        if spill_dir is None:
+            frames = [df async for df in chunks]
+            return pd.concat(frames) if frames else pd.DataFrame()
+
+        os.makedirs(spill_dir, exist_ok=True)
+        n = 0
+        async for df in chunks:
+            df.to_parquet(os.path.join(spill_dir, f"{id}-{n:06d}.parquet"))
+            n += 1
+        return spill_dir
+
+
+class AsyncCollectionModule(CollectionModule):
+    def __init__(self, comms: AsyncComms) -> None:
+        BaseModule.__init__(self, comms)
+
+    async def load(self, id: int) -> dataModels.Collection:
+        return await self.get_page(id)
+
+    async def get_page(self, id: int, **kwargs) -> dataModels.Collection:
+        rtn = await self.get(id, **kwargs)
+        if isinstance(rtn, responseModels.Error):
+            raise Exception(f"Error {rtn.code}: {rtn.message}")
+        if not rtn:
+            raise Exception(f"Collection {id} not found")
+        return rtn[0]
+
+    async def get_frame(
+        self,
+        id: int,
+        limit: int = 10,
+        query: Optional[Dict] = None,
+        columns: Optional[List[str]] = None,
+        **kwargs,
+    ):
+        projection = None
+        if columns is not None:
+            projection = list(dict.fromkeys(c.split(".")[0] for c in columns))
+        page = await self.get_page(id, limit=limit, query=query, projection=projection)
+        return page.to_dataframe(columns=columns, **kwargs)
+
+    async def iter(
+        self,
+        *ids: List[int],
+        limit: int = 10,
+        query: Optional[Dict] = None,
+        skip: int = 0,
+        cursor: Optional[str] = None,
+        projection: Optional[List[str]] = None,
+    ) -> AsyncIterator[dataModels.Collection]:
+        params = self.get_params(ids, limit, query, skip, cursor, projection)
+        chunks = self.comms.stream_get("collection/get", params=params)
+        async for item in aiter_response_data(chunks):
+            yield self.parse_obj(dataModels.Collection, item)
+
+    async def iter_documents(
+        self,
+        id: int,
+        query: Optional[Dict] = None,
+        page_size: Optional[int] = None,
+        projection: Optional[List[str]] = None,
+        prefetch: Optional[int] = None,
+    ) -> AsyncIterator[dict]:
+        if page_size is None:
+            page_size = config["collection"]["page_size"]
+        if prefetch is None:
+            prefetch = config["collection"]["prefetch"]
+
+        async def pages():
+            pager = Pager(id, page_size)
+            while not pager.done:
+                page = await self.get_page(
+                    id,
+                    limit=page_size,
+                    query=query,
+                    projection=projection,
+                    **pager.params(),
+                )
+                yield pager.advance(page)
+
+        async for documents in aread_ahead(pages(), prefetch):
+            for document in documents:
+                yield document
+
+
+class AsyncDataModelModule(DataModelModule):
+    async def fetch_definition(self, name: str) -> dataModels.DataModelDefinition:
+        definition = await self.get_definition(name)
+        if isinstance(definition, responseModels.Error):
+            raise Exception(f"Error {definition.code}: {definition.message}")
+        return definition
+
+    async def model(self, name: str) -> type[dataModels.DataModel]:
+        model = self.registry.cached(name)
+        if model is None:
+            model = self.registry.register(await self.fetch_definition(name), name)
+        return model
+
+    async def validate_frame(self, name: str, df):
+        return (await self.model(name)).validate_frame(df)
+
+    async def save_definition(self, name: str, datamodel: dataModels.DataModel):
+        rtn = await self.comms.post(
+            f"datamodel/{name}/definition", data=datamodel.get_definition().json()
+        )
+        self.registry.invalidate(name)
+        return rtn
+
+
+class AsyncQShedClient:
+    """Asyncio counterpart of QShedClient.
+
+    The modules have the same methods as QShedClient's, as coroutines
+    resolving to the same results; iter, iter_chunks and iter_documents are
+    async generators, and bulk_writer returns an AsyncBulkWriter. Loads are
+    not batched, as async callers can pass several ids to get.
+
+        async with AsyncQShedClient("http://localhost:4000") as client:
+            ts, cols = await client.gather(
+                client.timeseries.get(1), client.collection.get(2)
+            )
+    """
+
+    def __init__(
+        self,
+        gateway_address: str,
+        max_concurrency: Optional[int] = None,
+        trusted: bool = False,
+    ) -> None:
+        self.comms = AsyncComms(gateway_address, trusted=trusted)
+        self.gateway = GatewayModule(self.comms)
+        self.entity = AsyncEntityModule(self.comms)
+        self.timeseries = AsyncTimeseriesModule(self.comms)
+        self.collection = AsyncCollectionModule(self.comms)
+        self.datamodel = AsyncDataModelModule(self.comms)
+        if max_concurrency is None:
+            max_concurrency = config["async"]["max_concurrency"]
+        self.max_concurrency = max_concurrency
+
+    async def gather(
+        self, *aws: Awaitable, max_concurrency: Optional[int] = None
+    ) -> List:
+        """Await all of `aws` with at most `max_concurrency` in flight, in order."""
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+
+        async def bounded(aw):
+            async with semaphore:
+                return await aw
+
+        return await asyncio.gather(*(bounded(aw) for aw in aws))
+
+    async def close(self) -> None:
+        await self.comms.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    @property
+    def ts(self):
+        return self.timeseries
+
+    @property
+    def col(self):
+        return self.collection
@@ -0,0 +1,201 @@
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+ROUND_ROBIN = "round_robin"
+LEAST_OUTSTANDING = "least_outstanding"
+EWMA = "ewma"
+
+STRATEGIES = (ROUND_ROBIN, LEAST_OUTSTANDING, EWMA)
+
+
+class Gateway:
+    """One gateway replica and what the balancer has observed of it."""
+
+    def __init__(self, address: str) -> None:
+        self.address = address
+        self.outstanding = 0
+        # Smoothed request latency in seconds, None until the first response
+        self.ewma = None
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def ejected(self) -> bool:
+        return self.ejected_until > time.monotonic()
+
+    def __repr__(self) -> str:
+        return (
+            f"Gateway({self.address!r}, outstanding={self.outstanding}, "
+            f"ewma={self.ewma}, ejected={self.ejected})"
+        )
+
+
+class Balancer:
+    """Spread requests over gateway replicas serving the same data.
+
+    `round_robin` takes turns; `least_outstanding` picks the replica with the
+    fewest requests in flight; `ewma` weighs those by each replica's smoothed
+    latency, so a slow replica receives proportionally less traffic.
+
+    A replica failing `eject_after` requests in a row is ejected for
+    `eject_seconds`; a health check (see `start_health_checks`) brings it back
+    sooner once it answers again. If every replica is ejected the one ejected
+    first is used rather than failing outright.
+
+    `hedge_delay` is the `hedge_percentile` latency of recent requests to an
+    endpoint: an idempotent request still running after that long is worth
+    repeating on another replica.
+    """
+
+    def __init__(
+        self,
+        addresses: List[str],
+        strategy: str = LEAST_OUTSTANDING,
+        ewma_alpha: float = 0.3,
+        eject_after: int = 3,
+        eject_seconds: float = 30,
+        hedge_percentile: Optional[float] = 95,
+        hedge_min_samples: int = 20,
+        latency_window: int = 200,
+    ) -> None:
+        if not addresses:
+            raise ValueError("At least one gateway address is required")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown balancing strategy: {strategy}")
+        self.gateways = [Gateway(address) for address in addresses]
+        self.strategy = strategy
+        self.ewma_alpha = ewma_alpha
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latency_window = latency_window
+        # Recent latencies by endpoint, as endpoints differ widely
+        self.latencies = {}
+        self.turns = itertools.count()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.checker = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def score(self, gateway: Gateway) -> float:
+        if self.strategy == EWMA:
+            # Unmeasured replicas score as the fastest, so they get tried
+            ewma = gateway.ewma or 0.0
+            return ewma * (gateway.outstanding + 1)
+        return gateway.outstanding
+
+    def choose(self, exclude: tuple = ()) -> Gateway:
+        with self.lock:
+            candidates = [g for g in self.gateways if g not in exclude]
+            available = [g for g in candidates if not g.ejected]
+            if not available:
+                # Better to try a replica that may have recovered than to fail
+                return min(candidates or self.gateways, key=lambda g: g.ejected_until)
+            if self.strategy == ROUND_ROBIN:
+                return available[next(self.turns) % len(available)]
+            # Random tie breaks keep idle replicas evenly used
+            return min(available, key=lambda g: (self.score(g), random.random()))
+
+    @contextmanager
+    def track(self, gateway: Gateway, endpoint: str = ""):
+        """Count a request to `gateway` as outstanding while the block runs."""
+        with self.lock:
+            gateway.outstanding += 1
+            gateway.requests += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                gateway.outstanding -= 1
+        self.observe(gateway, time.perf_counter() - start, endpoint)
+
+    def observe(self, gateway: Gateway, seconds: float, endpoint: str = "") -> None:
+        with self.lock:
+            if gateway.ewma is None:
+                gateway.ewma = seconds
+            else:
+                gateway.ewma += self.ewma_alpha * (seconds - gateway.ewma)
+            latencies = self.latencies.get(endpoint)
+            if latencies is None:
+                latencies = self.latencies[endpoint] = deque(maxlen=self.latency_window)
+            latencies.append(seconds)
+
+    def succeeded(self, gateway: Gateway) -> None:
+        with self.lock:
+            gateway.failures = 0
+            gateway.ejected_until = 0.0
+
+    def failed(self, gateway: Gateway) -> None:
+        with self.lock:
+            gateway.errors += 1
+            gateway.failures += 1
+            if gateway.failures < self.eject_after or gateway.ejected:
+                return
+            gateway.ejected_until = time.monotonic() + self.eject_seconds
+        self.logger.warning(
+            f"Ejecting {gateway.address} for {self.eject_seconds}s after "
+            f"{gateway.failures} failures"
+        )
+
+    def hedge_delay(self, endpoint: str = "") -> Optional[float]:
+        """Seconds after which to hedge a request, None if hedging is off."""
+        if self.hedge_percentile is None or len(self.gateways) < 2:
+            return None
+        with self.lock:
+            latencies = self.latencies.get(endpoint, ())
+            if len(latencies) < self.hedge_min_samples:
+                return None
+            latencies = sorted(latencies)
+        rank = int(len(latencies) * self.hedge_percentile / 100)
+        return latencies[min(rank, len(latencies) - 1)]
+
+    def check(self, ping: Callable[[str], object]) -> None:
+        """Ping every replica, restoring those that answer and ejecting the rest."""
+        for gateway in self.gateways:
+            try:
+                ping(gateway.address)
+            except Exception as e:
+                self.logger.debug(f"{e} - Health check of {gateway.address} failed")
+                with self.lock:
+                    gateway.failures = max(gateway.failures, self.eject_after - 1)
+                self.failed(gateway)
+            else:
+                if gateway.ejected:
+                    self.logger.info(f"Restoring {gateway.address}")
+                self.succeeded(gateway)
+
+    def start_health_checks(
+        self, ping: Callable[[str], object], interval: float
+    ) -> None:
+        def run():
+            while not self.stopped.wait(interval):
+                self.check(ping)
+
+        self.checker = threading.Thread(target=run, daemon=True)
+        self.checker.start()
+
+    def close(self) -> None:
+        self.stopped.set()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                gateway.address: {
+                    "outstanding": gateway.outstanding,
+                    "ewma": gateway.ewma,
+                    "requests": gateway.requests,
+                    "errors": gateway.errors,
+                    "ejected": gateway.ejected,
+                }
+                for gateway in self.gateways
+            }
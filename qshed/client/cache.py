@@ -0,0 +1,226 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from urllib.parse import urlencode
+
+
+def canonical_params(params: dict) -> list:
+    items = []
+    for key in sorted(params):
+        value = params[key]
+        if isinstance(value, (list, tuple)):
+            items.extend((key, str(v)) for v in value)
+        elif isinstance(value, dict):
+            items.append((key, json.dumps(value, sort_keys=True)))
+        elif value is not None:
+            items.append((key, str(value)))
+    return items
+
+
+def cache_key(url: str, params: dict = {}) -> str:
+    if not params:
+        return url
+    return url + "?" + urlencode(canonical_params(params))
+
+
+class CacheEntry:
+    __slots__ = ("value", "nbytes", "expires", "etag", "last_modified")
+
+    def __init__(
+        self,
+        value: str,
+        nbytes: int,
+        expires: float,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        self.value = value
+        self.nbytes = nbytes
+        self.expires = expires
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires
+
+    @property
+    def age_past_expiry(self) -> float:
+        return time.monotonic() - self.expires
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """LRU cache of response bodies with per-entry expiry and a byte budget.
+
+    TTLs are looked up by the longest matching endpoint prefix in `ttls`,
+    falling back to `default_ttl`; a TTL of 0 disables caching for that prefix.
+
+    Expired entries are kept while they can still be used: when they carry
+    validators for a conditional request, or for `stale_while_revalidate`
+    seconds past expiry.
+
+    An optional `backing` cache (e.g. DiskCache) is written through and
+    consulted on misses, so entries outlive the process.
+    """
+
+    def __init__(
+        self,
+        default_ttl: float,
+        ttls: Optional[Dict[str, float]] = None,
+        max_bytes: int = 64 * 1024 * 1024,
+        maxsize: Optional[int] = None,
+        stale_while_revalidate: float = 0,
+        backing=None,
+    ) -> None:
+        self.default_ttl = default_ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.ttls = sorted((ttls or {}).items(), key=lambda i: len(i[0]), reverse=True)
+        self.max_bytes = max_bytes
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+        self.revalidations = 0
+        self.backing = backing
+        self.backing_hits = 0
+        self.lock = threading.Lock()
+
+    def ttl_for(self, endpoint: str) -> float:
+        for prefix, ttl in self.ttls:
+            if endpoint.startswith(prefix):
+                return ttl
+        return self.default_ttl
+
+    def _remove(self, key: str) -> None:
+        entry = self.entries.pop(key)
+        self.nbytes -= entry.nbytes
+
+    def can_serve_stale(self, entry: CacheEntry) -> bool:
+        return (
+            self.stale_while_revalidate > 0
+            and entry.age_past_expiry <= self.stale_while_revalidate
+        )
+
+    def lookup(self, key: str) -> Optional[CacheEntry]:
+        """Return the entry for `key`, which may be expired but still usable."""
+        if self.backing is not None:
+            with self.lock:
+                held = self.entries.get(key)
+            # Another process may have refreshed an entry that expired here
+            if held is None or held.expired:
+                entry = self.backing.lookup(key)
+                if entry is not None:
+                    with self.lock:
+                        self.backing_hits += 1
+                        self._insert(key, entry)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expired:
+                self.expirations += 1
+                if self.can_serve_stale(entry):
+                    self.stale_hits += 1
+                elif entry.validators:
+                    self.misses += 1
+                else:
+                    self._remove(key)
+                    self.misses += 1
+                    return None
+            else:
+                self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.lookup(key)
+        if entry is None or entry.expired:
+            return None
+        return entry.value
+
+    def set(
+        self,
+        key: str,
+        value: str,
+        ttl: float,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        if ttl <= 0:
+            return
+        if self.backing is not None:
+            self.backing.set(key, value, ttl, etag, last_modified)
+        entry = CacheEntry(
+            value, len(value), time.monotonic() + ttl, etag, last_modified
+        )
+        with self.lock:
+            self._insert(key, entry)
+
+    def _insert(self, key: str, entry: CacheEntry) -> None:
+        if entry.nbytes > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = entry
+        self.nbytes += entry.nbytes
+        while self.nbytes > self.max_bytes or (
+            self.maxsize is not None and len(self.entries) > self.maxsize
+        ):
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def refresh(self, key: str, ttl: float) -> None:
+        """Extend the life of `key` after the gateway confirmed it unchanged."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry.expires = time.monotonic() + ttl
+                self.revalidations += 1
+        if self.backing is not None:
+            self.backing.refresh(key, ttl)
+
+    def invalidate(self, prefix: str = "") -> None:
+        with self.lock:
+            for key in [k for k in self.entries if k.startswith(prefix)]:
+                self._remove(key)
+        if self.backing is not None:
+            self.backing.invalidate(prefix)
+
+    def clear(self) -> None:
+        self.invalidate()
+
+    def stats(self) -> dict:
+        backing = {}
+        if self.backing is not None:
+            backing = {f"backing_{k}": v for k, v in self.backing.stats().items()}
+            backing["backing_hits"] = self.backing_hits
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                **backing,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "stale_hits": self.stale_hits,
+                "revalidations": self.revalidations,
+                "entries": len(self.entries),
+                "bytes": self.nbytes,
+            }
@@ -1,62 +1,459 @@
+from __future__ import annotations
+
 import logging
-from typing import List, Dict, Optional, Union
-import pandas as pd
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Dict, Iterator, Optional, Union
 import requests
-import json
-from pydantic import parse_obj_as
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
 
 from . import config
+from . import codecs
+from . import compression
+from .balancer import Balancer
+from .cache import CacheEntry, ResponseCache, cache_key
+from .interrupt import InterruptibleAdapter, InterruptibleRequest, current_request
+from .loader import DataLoader
+from .metrics import Metrics, route
+from .registry import DataModelRegistry
+from .stream import ServerSentEvent, iter_response_data
+from .subscription import Subscription
+from .writer import BulkWriter
 from .models import data as dataModels
 from .models import response as responseModels
-from .utils import typed_response, flatten_dict, timed_lru_cache
-
-
-class Comms:
-    def __init__(self, address: str) -> None:
-        if not address.endswith("/"):
-            address += "/"
-        self.address = address
+from .utils import (
+    typed_response,
+    current_decoder,
+    Decoded,
+    time_windows,
+    read_ahead,
+    SingleFlight,
+    json_dumps,
+    json_loads,
+    construct_model,
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class BaseComms:
+    """Metrics, response logging and body encoding shared by Comms and AsyncComms."""
+
+    @staticmethod
+    def create_metrics() -> Optional[Metrics]:
+        metrics_config = config["metrics"]
+        if not metrics_config["enabled"]:
+            return None
+        return Metrics(metrics_config["buckets"])
+
+    def measure(self, url_ext: str, sent_bytes: int = 0):
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.request(route(url_ext), sent_bytes)
+
+    def log_response(self, url_ext: str, resp) -> None:
+        if self.metrics is not None:
+            self.metrics.response(
+                route(url_ext), len(resp.content), resp.status_code < 400
+            )
+        # Only format the (truncated) body when it will actually be logged
+        if self.logger.isEnabledFor(logging.DEBUG):
+            limit = config["logging"]["body_limit"]
+            more = "..." if len(resp.content) > limit else ""
+            self.logger.debug(
+                f"STATUS: {resp.status_code} CONTENT: {resp.content[:limit]!r}{more}"
+            )
+
+    def encode_body(self, data: str):
+        """Return the POST body and headers, compressing large bodies."""
+        body = data.encode("utf-8")
+        encoding = compression.request_encoding(len(body))
+        if encoding is None:
+            return body, self.headers
+        headers = {**self.headers, "Content-Encoding": encoding}
+        return compression.compress(body, encoding), headers
+
+
+class Comms(BaseComms):
+    def __init__(self, address: Union[str, List[str]], trusted: bool = False) -> None:
+        addresses = [address] if isinstance(address, str) else list(address)
+        addresses = [a if a.endswith("/") else a + "/" for a in addresses]
+        # Replicas serve the same data, so cache keys use the first address
+        self.address = addresses[0]
+        self.balancer = self.create_balancer(addresses)
+        self.hedge_pool = None
+        if len(addresses) > 1:
+            # Room for a hedge alongside each pooled connection's request
+            self.hedge_pool = ThreadPoolExecutor(
+                max_workers=2 * config["transport"]["pool_maxsize"]
+            )
+        self.trusted = trusted
         self.headers = {"Content-Type": "application/json"}
         self.logger = logging.getLogger(self.__class__.__name__)
+        self.timeout = (
+            config["transport"]["timeout"]["connect"],
+            config["transport"]["timeout"]["read"],
+        )
+        self.session = self.create_session(failover=len(addresses) > 1)
+        self.cache = self.create_cache()
+        self.revalidating = set()
+        self.revalidating_lock = threading.Lock()
+        self.inflight = SingleFlight()
+        self.metrics = self.create_metrics()
+        if self.metrics is not None and self.cache is not None:
+            self.metrics.add_source(
+                lambda: {
+                    f"qshed_client_cache_{name}": value
+                    for name, value in self.cache.stats().items()
+                }
+            )
+
+    @staticmethod
+    def create_session(failover: bool = False) -> requests.Session:
+        transport_config = config["transport"]
+        retries = Retry(
+            # With several gateways failing over to another replica replaces
+            # retrying the same one
+            total=0 if failover else transport_config["retries"]["total"],
+            backoff_factor=transport_config["retries"]["backoff_factor"],
+            status_forcelist=transport_config["retries"]["status_forcelist"],
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            raise_on_status=False,
+        )
+        # Requests to several gateways may be hedged, which cuts the loser short
+        adapter_class = InterruptibleAdapter if failover else HTTPAdapter
+        adapter = adapter_class(
+            pool_connections=transport_config["pool_connections"],
+            pool_maxsize=transport_config["pool_maxsize"],
+            max_retries=retries,
+        )
+        session = requests.Session()
+        session.headers[codecs.ENCODING_HEADER] = ", ".join(
+            codecs.available_encodings()
+        )
+        session.headers["Accept-Encoding"] = compression.accept_encoding(
+            session.headers["Accept-Encoding"]
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    @staticmethod
+    def create_balancer(addresses: List[str]) -> Balancer:
+        gateways_config = config["gateways"]
+        return Balancer(
+            addresses,
+            strategy=gateways_config["strategy"],
+            ewma_alpha=gateways_config["ewma_alpha"],
+            eject_after=gateways_config["eject_after"],
+            eject_seconds=gateways_config["eject_seconds"],
+            hedge_percentile=gateways_config["hedge_percentile"],
+            hedge_min_samples=gateways_config["hedge_min_samples"],
+            latency_window=gateways_config["latency_window"],
+        )
 
-    @timed_lru_cache(
-        seconds=config["caching"]["lifetime"], maxsize=config["caching"]["maxsize"]
-    )
-    def cached_get(self, address):
-        self.logger.debug("Returning cached response")
-        return requests.get(address)
-
-    def getter(self, address, params={}):
-        if config["caching"]["enabled"]:
-            if not params:
-                try:
-                    return self.cached_get(address)
-                except TypeError as t:
-                    pass
-        return requests.get(address, params=params)
+    def start_health_checks(self, ping) -> None:
+        """Call `ping(gateway=address)` on every replica in the background."""
+        interval = config["gateways"]["health_interval"]
+        if len(self.balancer.gateways) < 2 or not interval:
+            return
+        self.balancer.start_health_checks(
+            lambda address: ping(gateway=address), interval
+        )
+
+    def close(self) -> None:
+        self.balancer.close()
+        if self.hedge_pool is not None:
+            self.hedge_pool.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+        if self.cache is not None and self.cache.backing is not None:
+            self.cache.backing.close()
+
+    @staticmethod
+    def create_cache() -> Optional[ResponseCache]:
+        cache_config = config["caching"]
+        if not cache_config["enabled"]:
+            return None
+        backing = None
+        disk_config = cache_config["disk"]
+        if disk_config["enabled"]:
+            from .disk_cache import DiskCache
+
+            directory = disk_config["dir"] or os.path.join(
+                os.path.expanduser("~"), ".cache", "qshed"
+            )
+            backing = DiskCache(directory, max_bytes=disk_config["max_bytes"])
+        return ResponseCache(
+            cache_config["lifetime"],
+            ttls=cache_config.get("ttl"),
+            max_bytes=cache_config["max_bytes"],
+            maxsize=cache_config["maxsize"],
+            stale_while_revalidate=cache_config["stale_while_revalidate"],
+            backing=backing,
+        )
+
+    def getter(self, address, params={}, headers={}):
+        return self.session.get(
+            address, params=params, headers=headers, timeout=self.timeout
+        )
 
     def poster(self, address, data="", params={}, headers={}):
-        return requests.post(address, data=data, params=params, headers=headers)
+        return self.session.post(
+            address, data=data, params=params, headers=headers, timeout=self.timeout
+        )
 
-    def get(self, url_ext: str, params: dict = {}):
-        resp = self.getter(self.address + url_ext, params=params)
-        self.logger.debug(f"STATUS: {resp.status_code} CONTENT: {resp.content}")
+    def attempt(self, gateway, send, url_ext: str, **kwargs) -> requests.Response:
+        """Send one request to `gateway`, reporting the outcome to the balancer."""
+        try:
+            with self.balancer.track(gateway, url_ext):
+                resp = send(gateway.address + url_ext, **kwargs)
+        except requests.RequestException:
+            request = current_request()
+            # A request cut short by a faster hedge did not fail
+            if request is None or not request.interrupted:
+                self.balancer.failed(gateway)
+            raise
+        if resp.status_code >= 500:
+            self.balancer.failed(gateway)
+        else:
+            self.balancer.succeeded(gateway)
+        return resp
+
+    def hedged(self, gateway, send, url_ext: str, **kwargs) -> requests.Response:
+        """Like attempt, but repeat the request on another replica if it is slow.
+
+        The first attempt runs on the calling thread. If it is still running
+        after the hedge delay, a second is sent from hedge_pool; should that
+        return a response below 500 first, the first attempt's connection is
+        cut and the second response used.
+        """
+        delay = self.balancer.hedge_delay(url_ext)
+        if delay is None:
+            return self.attempt(gateway, send, url_ext, **kwargs)
+        request = InterruptibleRequest()
+        deadline = time.monotonic() + delay
+        hedge = self.hedge_pool.submit(
+            self.hedge, request, deadline, gateway, send, url_ext, **kwargs
+        )
+        resp = error = None
+        try:
+            with request:
+                resp = self.attempt(gateway, send, url_ext, **kwargs)
+        except requests.RequestException as e:
+            error = e
+        if request.interrupted:
+            if resp is not None:
+                resp.close()
+            return hedge.result()
+        if resp is not None and resp.status_code < 500:
+            hedge.add_done_callback(self.discard_hedge)
+            return resp
+        # The first attempt failed: use the hedge if it was sent and succeeded
+        if not hedge.cancel():
+            try:
+                backup = hedge.result()
+            except requests.RequestException:
+                backup = None
+            if backup is not None:
+                if backup.status_code < 500:
+                    if resp is not None:
+                        resp.close()
+                    return backup
+                backup.close()
+        if error is not None:
+            raise error
+        return resp
+
+    def hedge(self, request, deadline, gateway, send, url_ext: str, **kwargs):
+        """Repeat `request` on another replica unless it finishes by `deadline`.
+
+        Returns the response, or None if no hedge was sent.
+        """
+        if request.finished.wait(max(deadline - time.monotonic(), 0)):
+            return None
+        backup = self.balancer.choose(exclude=(gateway,))
+        self.logger.debug(f"Hedging {url_ext} on {backup.address}")
+        resp = self.attempt(backup, send, url_ext, **kwargs)
+        if resp.status_code < 500:
+            request.interrupt()
+        return resp
+
+    @staticmethod
+    def discard_hedge(future) -> None:
+        # The first attempt won; release the hedge's connection
+        if not future.cancelled() and future.exception() is None:
+            if future.result() is not None:
+                future.result().close()
+
+    def request(
+        self, send, url_ext: str, idempotent: bool = False, hedge: bool = True, **kwargs
+    ) -> requests.Response:
+        """Send a request to the gateway replica chosen by the balancer.
+
+        Idempotent requests fail over to the other replicas in turn on
+        connection errors and 5xx responses, and unless `hedge` is False are
+        hedged once slower than the configured latency percentile.
+        """
+        gateway = self.balancer.choose()
+        if not idempotent:
+            return self.attempt(gateway, send, url_ext, **kwargs)
+        tried = [gateway]
+        n_gateways = len(self.balancer.gateways)
+        while True:
+            last = len(tried) == n_gateways
+            try:
+                if hedge:
+                    resp = self.hedged(gateway, send, url_ext, **kwargs)
+                else:
+                    resp = self.attempt(gateway, send, url_ext, **kwargs)
+            except requests.RequestException as e:
+                if last:
+                    raise
+                self.logger.warning(f"{e} - Failing over from {gateway.address}")
+            else:
+                if resp.status_code < 500 or last:
+                    return resp
+                resp.close()
+            gateway = self.balancer.choose(exclude=tuple(tried))
+            tried.append(gateway)
+
+    def fetch(self, url_ext: str, params: dict = {}, entry: CacheEntry = None):
+        headers = entry.validators if entry is not None else {}
+        with self.measure(url_ext):
+            resp = self.request(
+                self.getter, url_ext, idempotent=True, params=params, headers=headers
+            )
+        self.log_response(url_ext, resp)
+
+        if self.cache is not None:
+            key = cache_key(self.address + url_ext, params)
+            ttl = self.cache.ttl_for(url_ext)
+            if resp.status_code == 304 and entry is not None:
+                self.cache.refresh(key, ttl)
+                return entry.value
+            if resp.ok:
+                self.cache.set(
+                    key,
+                    resp.text,
+                    ttl,
+                    etag=resp.headers.get("ETag"),
+                    last_modified=resp.headers.get("Last-Modified"),
+                )
 
         if resp.ok:
             return resp.text
         else:
             raise Exception(f"Error {resp.status_code}: {resp.text}")
 
+    def revalidate(self, url_ext: str, params: dict, entry: CacheEntry) -> None:
+        key = cache_key(self.address + url_ext, params)
+        with self.revalidating_lock:
+            if key in self.revalidating:
+                return
+            self.revalidating.add(key)
+
+        def run():
+            try:
+                self.fetch(url_ext, params, entry)
+            except Exception as e:
+                self.logger.warning(f"{e} - Unable to revalidate {key}")
+            finally:
+                with self.revalidating_lock:
+                    self.revalidating.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def lookup_or_fetch(self, url_ext: str, params: dict = {}):
+        entry = None
+        if self.cache is not None:
+            key = cache_key(self.address + url_ext, params)
+            entry = self.cache.lookup(key)
+            if entry is not None:
+                if not entry.expired:
+                    self.logger.debug(f"Returning cached response for {key}")
+                    return entry.value
+                if self.cache.can_serve_stale(entry):
+                    self.logger.debug(f"Returning stale response for {key}")
+                    self.revalidate(url_ext, params, entry)
+                    return entry.value
+
+        return self.fetch(url_ext, params, entry)
+
+    def get(self, url_ext: str, params: dict = {}, gateway: Optional[str] = None):
+        if gateway is not None:
+            # Addressed to one replica (health checks): no cache or balancing
+            timeout = config["gateways"]["health_timeout"]
+            resp = self.session.get(gateway + url_ext, params=params, timeout=timeout)
+            if not resp.ok:
+                raise Exception(f"Error {resp.status_code}: {resp.text}")
+            return resp.text
+        # Concurrent identical GETs share a single lookup/request
+        key = cache_key(self.address + url_ext, params)
+        decoder = current_decoder()
+        if decoder is None:
+            return self.inflight.do(key, self.lookup_or_fetch, url_ext, params)
+
+        # Called from a typed_response method they share the decode too, and so
+        # receive the same response object
+        def lookup_and_decode():
+            return decoder(self.lookup_or_fetch(url_ext, params))
+
+        return Decoded(self.inflight.do((key, decoder.key), lookup_and_decode))
+
+    def open_stream(
+        self, url_ext: str, params: dict = {}, headers: dict = {}, timeout=None
+    ) -> requests.Response:
+        """GET `url_ext` bypassing the cache, returning the unread response."""
+        with self.measure(url_ext):
+            # Never hedged: the losing stream would be left open
+            resp = self.request(
+                self.session.get,
+                url_ext,
+                idempotent=True,
+                hedge=False,
+                params=params,
+                headers=headers,
+                timeout=timeout or self.timeout,
+                stream=True,
+            )
+        self.logger.debug(f"STATUS: {resp.status_code} (streamed)")
+        if not resp.ok:
+            with resp:
+                raise requests.HTTPError(
+                    f"Error {resp.status_code}: {resp.text}", response=resp
+                )
+        resp.encoding = resp.encoding or "utf-8"
+        return resp
+
+    def stream_get(self, url_ext: str, params: dict = {}) -> Iterator[str]:
+        """GET `url_ext` bypassing the cache, yielding the body as text chunks."""
+        with self.open_stream(url_ext, params) as resp:
+            yield from resp.iter_content(
+                chunk_size=config["transport"]["stream_chunk_size"],
+                decode_unicode=True,
+            )
+
     def post(self, url_ext: str, params: dict = {}, data: str = ""):
         if not isinstance(data, str):
-            data = json.dumps(data)
-        resp = self.poster(
-            self.address + url_ext, data=data, params=params, headers=self.headers
-        )
-        self.logger.debug(f"STATUS: {resp.status_code} CONTENT: {resp.content}")
+            data = json_dumps(data)
+        body, headers = self.encode_body(data)
+        with self.measure(url_ext, len(body)):
+            resp = self.request(
+                self.poster, url_ext, data=body, params=params, headers=headers
+            )
+        self.log_response(url_ext, resp)
 
         if resp.ok:
+            if self.cache is not None:
+                # Writes make cached reads of the same resource stale
+                self.cache.invalidate(self.address + url_ext.split("/")[0])
             return resp.text
         else:
             raise Exception(f"Error {resp.status_code}: {resp.content}")
@@ -67,16 +464,41 @@ class BaseModule:
         self.comms = comms
         self.logger = logging.getLogger(self.__class__.__name__)
 
+    def parse_obj(self, model_type, obj):
+        if self.comms.trusted:
+            return construct_model(model_type, obj)
+        return model_type.parse_obj(obj)
+
 
 class GatewayModule(BaseModule):
-    def ping(self):
-        return self.comms.get(f"ping")
+    def ping(self, gateway: Optional[str] = None):
+        if gateway is not None:
+            return self.comms.get("ping", gateway=gateway)
+        return self.comms.get("ping")
 
 
 class EntityModule(BaseModule):
+    def __init__(self, comms: Comms) -> None:
+        super().__init__(comms)
+        self.loader = DataLoader(
+            lambda ids: self.get(*ids),
+            max_batch_size=config["loader"]["max_batch_size"],
+            wait=config["loader"]["wait"],
+        )
+
+    def load(self, id: int) -> dataModels.Entity:
+        """Fetch one entity, batched with other concurrent loads."""
+        return self.loader.load(id)
+
     @typed_response
     def get(self, *ids: List[int]) -> responseModels.EntityListResponse:
-        return self.comms.get(f"entity/get", params={"id": ids})
+        return self.comms.get("entity/get", params={"id": ids})
+
+    def iter(self, *ids: List[int]) -> Iterator[dataModels.Entity]:
+        """Like get, but parse and yield entities one at a time as they arrive."""
+        chunks = self.comms.stream_get("entity/get", params={"id": ids})
+        for item in iter_response_data(chunks):
+            yield self.parse_obj(dataModels.Entity, item)
 
     @typed_response
     def get_roots(self) -> responseModels.EntityListResponse:
@@ -96,19 +518,48 @@ class EntityModule(BaseModule):
 
 
 class TimeseriesModule(BaseModule):
+    def __init__(self, comms: Comms) -> None:
+        super().__init__(comms)
+        store_config = config["timeseries"]["store"]
+        self.store = None
+        if store_config["enabled"]:
+            from .store import TimeseriesStore
+
+            self.store = TimeseriesStore(
+                store_config["max_bytes"], disk_dir=store_config["disk_dir"]
+            )
+
+    @staticmethod
+    def default_window(start: Optional[datetime], end: Optional[datetime]):
+        if end is None:
+            end = datetime.utcnow()
+        if start is None:
+            start = end - timedelta(days=365)
+        return start, end
+
     @typed_response
     def get(
         self,
         *ids: List[int],
         start: Optional[datetime] = None,
         end: Optional[datetime] = None,
+        resample: Optional[Union[str, float, timedelta]] = None,
+        agg: Optional[str] = None,
+        columns: Optional[List[str]] = None,
     ) -> responseModels.TimeseriesListResponse:
-        if end is None:
-            end = datetime.utcnow()
-        if start is None:
-            start = end - timedelta(days=365)
+        """Fetch timeseries over [start, end].
+
+        With `resample` the gateway returns one row per bin of that width,
+        reduced by `agg` (mean, min, max, last or lttb; see
+        aggregate.Aggregator); `columns` limits the columns returned.
+        """
+        start, end = self.default_window(start, end)
 
         params = dict(start=start.timestamp(), end=end.timestamp(), id=ids)
+        if resample is not None or columns is not None:
+            from . import aggregate
+
+            params.update(aggregate.params(resample, agg, columns))
         return self.comms.get("timeseries/get", params=params)
 
     @typed_response
@@ -123,20 +574,312 @@ class TimeseriesModule(BaseModule):
     ) -> responseModels.TimeseriesResponse:
         return self.comms.post("timeseries/add", data=timeseries.json())
 
+    def bulk_writer(self, **kwargs) -> BulkWriter:
+        return BulkWriter(self, **kwargs)
+
+    def get_chunk(
+        self, id: int, start: datetime, end: datetime, **kwargs
+    ) -> pd.DataFrame:
+        import pandas as pd
+
+        rtn = self.get(id, start=start, end=end, **kwargs)
+        if isinstance(rtn, responseModels.Error):
+            raise Exception(f"Error {rtn.code}: {rtn.message}")
+        if not rtn:
+            return pd.DataFrame()
+        return rtn[0].data
+
+    def get_frame(
+        self,
+        id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        resample: Optional[Union[str, float, timedelta]] = None,
+        agg: str = "mean",
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """Return the data of timeseries `id` over [start, end].
+
+        With the local store enabled only the parts of the window not already
+        held are requested from the gateway.
+
+        `resample`, `agg` and `columns` are as for get. With
+        timeseries.aggregation set to server they are sent to the gateway;
+        with client, raw chunks from iter_chunks are aggregated as they
+        arrive, giving the same result.
+        """
+        start, end = self.default_window(start, end)
+        if resample is not None or columns is not None:
+            return self.get_aggregated(id, start, end, resample, agg, columns)
+        if self.store is None:
+            return self.get_chunk(id, start, end)
+
+        for gap_start, gap_end in self.store.missing(id, start, end):
+            self.logger.debug(f"Fetching timeseries {id} gap {gap_start} - {gap_end}")
+            self.store.add(
+                id, gap_start, gap_end, self.get_chunk(id, gap_start, gap_end)
+            )
+        return self.store.select(id, start, end)
+
+    def get_aggregated(self, id, start, end, resample, agg, columns) -> pd.DataFrame:
+        if config["timeseries"]["aggregation"] == "server":
+            return self.get_chunk(
+                id, start, end, resample=resample, agg=agg, columns=columns
+            )
+
+        import pandas as pd
+        from .aggregate import Aggregator
+
+        if resample is None:
+            frames = [df[columns] for df in self.iter_chunks(id, start, end)]
+        else:
+            aggregator = Aggregator(resample, agg, columns)
+            frames = [aggregator.add(df) for df in self.iter_chunks(id, start, end)]
+            frames.append(aggregator.finish())
+        frames = [df for df in frames if not df.empty]
+        return pd.concat(frames) if frames else pd.DataFrame()
+
+    def iter_chunks(
+        self,
+        id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        chunk: Optional[timedelta] = None,
+        prefetch: Optional[int] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """Yield the timeseries `id` over [start, end] one `chunk` window at a time.
+
+        Up to `prefetch` windows are requested ahead of the consumer, so at most
+        `prefetch + 1` chunks are held in memory at once.
+        """
+        start, end = self.default_window(start, end)
+        if chunk is None:
+            chunk = timedelta(days=config["timeseries"]["chunk_days"])
+        if prefetch is None:
+            prefetch = config["timeseries"]["prefetch"]
+
+        windows = time_windows(start, end, chunk)
+        pending = deque()
+        last_index = None
+        executor = ThreadPoolExecutor(max_workers=max(prefetch, 1))
+
+        def submit_next():
+            window = next(windows, None)
+            if window is not None:
+                pending.append(executor.submit(self.get_chunk, id, *window))
+
+        try:
+            for _ in range(prefetch + 1):
+                submit_next()
+            while pending:
+                df = pending.popleft().result()
+                submit_next()
+                # Windows share their boundary instant; drop the repeated rows
+                if last_index is not None and not df.empty:
+                    df = df[df.index > last_index]
+                if df.empty:
+                    continue
+                last_index = df.index[-1]
+                yield df
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_chunked(
+        self,
+        id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        chunk: Optional[timedelta] = None,
+        prefetch: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+    ) -> Union[pd.DataFrame, str]:
+        """Fetch a long range through iter_chunks.
+
+        Without `spill_dir` the chunks are concatenated into one DataFrame. With
+        it, each chunk is written to a parquet file in `spill_dir` as it arrives
+        and the directory is returned; read it back with pd.read_parquet.
+        """
+        import pandas as pd
+
+        chunks = self.iter_chunks(id, start, end, chunk=chunk, prefetch=prefetch)
+        if spill_dir is None:
+            frames = list(chunks)
+            return pd.concat(frames) if frames else pd.DataFrame()
+
+        os.makedirs(spill_dir, exist_ok=True)
+        for n, df in enumerate(chunks):
+            df.to_parquet(os.path.join(spill_dir, f"{id}-{n:06d}.parquet"))
+        return spill_dir
+
+
+class Pager:
+    """Where each page of a collection starts when reading it page by page.
+
+    Follows the gateway's cursor when it returns one and falls back to
+    skip/limit offsets otherwise. A cursor returned again, or an offset the
+    gateway did not report applying, raises rather than repeating pages.
+    """
+
+    def __init__(self, id: int, page_size: int) -> None:
+        self.id = id
+        self.page_size = page_size
+        self.skip = 0
+        self.cursor = None
+        self.done = False
+
+    def params(self) -> dict:
+        return {"skip": self.skip, "cursor": self.cursor}
+
+    def advance(self, page: dataModels.Collection) -> list:
+        """Take in the page just read and return its documents."""
+        if self.cursor is not None and page.cursor == self.cursor:
+            raise Exception(
+                f"Collection {self.id} returned cursor {self.cursor} again; "
+                "cannot page it"
+            )
+        if self.skip and page.skip != self.skip:
+            raise Exception(
+                f"Collection {self.id} did not apply skip={self.skip} "
+                f"(returned skip={page.skip}); page it with a cursor"
+            )
+        documents = page.data or []
+        if page.cursor:
+            self.cursor = page.cursor
+        elif self.cursor is not None or len(documents) < self.page_size:
+            # An exhausted cursor, or a short page, ends the collection
+            self.done = True
+        else:
+            self.skip += len(documents)
+        return documents
+
 
 class CollectionModule(BaseModule):
-    @typed_response
-    def get(
-        self, *ids: List[int], limit: int = 10, query: Optional[Dict] = None
-    ) -> responseModels.CollectionListResponse:
+    def __init__(self, comms: Comms) -> None:
+        super().__init__(comms)
+        self.loader = DataLoader(
+            lambda ids: self.get(*ids),
+            max_batch_size=config["loader"]["max_batch_size"],
+            wait=config["loader"]["wait"],
+        )
+
+    def load(self, id: int) -> dataModels.Collection:
+        """Fetch one collection, batched with other concurrent loads."""
+        return self.loader.load(id)
+
+    @staticmethod
+    def get_params(
+        ids: List[int],
+        limit: int = 10,
+        query: Optional[Dict] = None,
+        skip: int = 0,
+        cursor: Optional[str] = None,
+        projection: Optional[List[str]] = None,
+    ) -> dict:
         params = {
             "id": ids,
             "limit": limit,
         }
         if query is not None:
             params["query"] = query
+        if skip:
+            params["skip"] = skip
+        if cursor is not None:
+            params["cursor"] = cursor
+        if projection is not None:
+            params["projection"] = ",".join(projection)
+        return params
 
-        return self.comms.get(f"collection/get", params=params)
+    @typed_response
+    def get(
+        self,
+        *ids: List[int],
+        limit: int = 10,
+        query: Optional[Dict] = None,
+        skip: int = 0,
+        cursor: Optional[str] = None,
+        projection: Optional[List[str]] = None,
+    ) -> responseModels.CollectionListResponse:
+        params = self.get_params(ids, limit, query, skip, cursor, projection)
+        return self.comms.get("collection/get", params=params)
+
+    def get_frame(
+        self,
+        id: int,
+        limit: int = 10,
+        query: Optional[Dict] = None,
+        columns: Optional[List[str]] = None,
+        **kwargs,
+    ) -> pd.DataFrame:
+        """Fetch collection `id` and return its documents as a flat DataFrame.
+
+        `columns` is also sent as the projection, so only those fields are
+        transferred. Extra keyword arguments (sep, dtypes, downcast,
+        category_threshold) are passed to Collection.to_dataframe.
+        """
+        projection = None
+        if columns is not None:
+            projection = list(dict.fromkeys(c.split(".")[0] for c in columns))
+        page = self.get_page(id, limit=limit, query=query, projection=projection)
+        return page.to_dataframe(columns=columns, **kwargs)
+
+    def iter(
+        self,
+        *ids: List[int],
+        limit: int = 10,
+        query: Optional[Dict] = None,
+        skip: int = 0,
+        cursor: Optional[str] = None,
+        projection: Optional[List[str]] = None,
+    ) -> Iterator[dataModels.Collection]:
+        """Like get, but parse and yield collections one at a time as they arrive."""
+        params = self.get_params(ids, limit, query, skip, cursor, projection)
+        chunks = self.comms.stream_get("collection/get", params=params)
+        for item in iter_response_data(chunks):
+            yield self.parse_obj(dataModels.Collection, item)
+
+    def get_page(self, id: int, **kwargs) -> dataModels.Collection:
+        rtn = self.get(id, **kwargs)
+        if isinstance(rtn, responseModels.Error):
+            raise Exception(f"Error {rtn.code}: {rtn.message}")
+        if not rtn:
+            raise Exception(f"Collection {id} not found")
+        return rtn[0]
+
+    def iter_documents(
+        self,
+        id: int,
+        query: Optional[Dict] = None,
+        page_size: Optional[int] = None,
+        projection: Optional[List[str]] = None,
+        prefetch: Optional[int] = None,
+    ) -> Iterator[dict]:
+        """Yield every document of collection `id` matching `query`, page by page.
+
+        Pages follow the gateway's cursor when it returns one and fall back to
+        skip/limit offsets otherwise. A background thread reads up to
+        `prefetch` pages ahead of the consumer. A gateway that returns the same
+        cursor again, or does not echo the skip it was sent, raises an
+        Exception rather than repeating pages.
+        """
+        if page_size is None:
+            page_size = config["collection"]["page_size"]
+        if prefetch is None:
+            prefetch = config["collection"]["prefetch"]
+
+        def pages():
+            pager = Pager(id, page_size)
+            while not pager.done:
+                page = self.get_page(
+                    id,
+                    limit=page_size,
+                    query=query,
+                    projection=projection,
+                    **pager.params(),
+                )
+                yield pager.advance(page)
+
+        for documents in read_ahead(pages(), prefetch):
+            yield from documents
 
     @typed_response
     def create(
@@ -158,23 +901,104 @@ class CollectionModule(BaseModule):
 
 
 class DataModelModule(BaseModule):
-    def get_definition(self, name: str):
+    def __init__(self, comms: Comms) -> None:
+        super().__init__(comms)
+        self.registry = DataModelRegistry(self.fetch_definition)
+
+    @typed_response
+    def get_definition(self, name: str) -> responseModels.DataModelDefinitionResponse:
         return self.comms.get(f"datamodel/{name}/definition")
 
+    def fetch_definition(self, name: str) -> dataModels.DataModelDefinition:
+        definition = self.get_definition(name)
+        if isinstance(definition, responseModels.Error):
+            raise Exception(f"Error {definition.code}: {definition.message}")
+        return definition
+
+    def model(self, name: str) -> type[dataModels.DataModel]:
+        """The DataModel class for `name`, fetched and built once."""
+        return self.registry.get(name)
+
+    def validate_frame(self, name: str, df):
+        """Validate a DataFrame of `name` records column by column."""
+        return self.registry.validate_frame(name, df)
+
     def save_definition(self, name: str, datamodel: dataModels.DataModel):
-        return self.comms.post(
-            f"datamodel/{name}/definition", data=datamodel.get_definition()
+        rtn = self.comms.post(
+            f"datamodel/{name}/definition", data=datamodel.get_definition().json()
+        )
+        self.registry.invalidate(name)
+        return rtn
+
+
+class SubscriptionModule(BaseModule):
+    def subscribe(
+        self,
+        timeseries_ids: Optional[List[int]] = None,
+        collection_ids: Optional[List[int]] = None,
+        last_event_id: Optional[str] = None,
+    ) -> Subscription:
+        """Follow new timeseries points and collection documents as they are
+        written, as Timeseries and Collection deltas holding only new data."""
+        params = {}
+        if timeseries_ids:
+            params["timeseries"] = list(timeseries_ids)
+        if collection_ids:
+            params["collection"] = list(collection_ids)
+        return Subscription(
+            self.comms, "subscribe", params, self.parse_event, last_event_id
         )
 
+    def parse_event(self, event: ServerSentEvent):
+        if event.event == "timeseries":
+            obj = dataModels.ts_json_loads(event.data)
+            return self.parse_obj(dataModels.Timeseries, obj)
+        if event.event == "collection":
+            return self.parse_obj(dataModels.Collection, json_loads(event.data))
+        if event.event == "error":
+            error = json_loads(event.data)
+            raise Exception(f"Error {error.get('code')}: {error.get('message')}")
+        self.logger.debug(f"Ignoring {event.event} event")
+        return None
+
 
 class QShedClient:
-    def __init__(self, gateway_address: str, config_file: str = "") -> None:
-        self.comms = Comms(gateway_address)
+    def __init__(
+        self,
+        gateway_address: Union[str, List[str]],
+        config_file: str = "",
+        trusted: bool = False,
+    ) -> None:
+        if config_file:
+            config.load(config_file)
+        # trusted: build response models without validating them
+        self.comms = Comms(gateway_address, trusted=trusted)
         self.gateway = GatewayModule(self.comms)
         self.entity = EntityModule(self.comms)
         self.timeseries = TimeseriesModule(self.comms)
         self.collection = CollectionModule(self.comms)
         self.datamodel = DataModelModule(self.comms)
+        self.subscriptions = SubscriptionModule(self.comms)
+        self.comms.start_health_checks(self.gateway.ping)
+
+    def close(self) -> None:
+        self.comms.close()
+
+    def subscribe(
+        self,
+        timeseries_ids: Optional[List[int]] = None,
+        collection_ids: Optional[List[int]] = None,
+        last_event_id: Optional[str] = None,
+    ) -> Subscription:
+        return self.subscriptions.subscribe(
+            timeseries_ids, collection_ids, last_event_id
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
     @property
     def ts(self):
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import base64
+import importlib.util
+from functools import lru_cache
+from io import StringIO
+from typing import TYPE_CHECKING, Dict, Union
+
+from . import config
+from . import compression
+from .utils import zip_str, unzip_str
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Legacy encoding: DataFrame.to_json, zlib compressed and base64'd into a bare string
+ZLIB_JSON = "zlib-json"
+# Plain DataFrame.to_json text in {"encoding", "data"}; with transport compression
+# the zlib and base64 layers of zlib-json only add work (and base64 adds size)
+JSON = "json"
+# Arrow IPC stream (zstd compressed buffers), base64'd into {"encoding", "data"}
+ARROW = "arrow"
+
+ENCODING_HEADER = "X-QShed-Timeseries-Encoding"
+
+
+@lru_cache(maxsize=None)
+def _has_pyarrow() -> bool:
+    # Checked without importing; pyarrow is only loaded once a frame is coded
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def available_encodings() -> tuple:
+    encodings = [ZLIB_JSON]
+    if compression.enabled():
+        encodings.insert(0, JSON)
+    if _has_pyarrow():
+        encodings.insert(0, ARROW)
+    return tuple(encodings)
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc
+    except ImportError as e:
+        raise RuntimeError(
+            "pyarrow is required for the arrow timeseries encoding"
+        ) from e
+    return pa
+
+
+def default_encoding() -> str:
+    return config.get("timeseries", {}).get("encoding", ZLIB_JSON)
+
+
+def _arrow_dumps(df: pd.DataFrame) -> bytes:
+    pa = _pyarrow()
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _arrow_loads(raw: bytes) -> pd.DataFrame:
+    pa = _pyarrow()
+    with pa.ipc.open_stream(pa.py_buffer(raw)) as reader:
+        table = reader.read_all()
+    return table.to_pandas()
+
+
+def encode_frame(df: pd.DataFrame, encoding: str = None) -> Union[str, Dict[str, str]]:
+    encoding = encoding or default_encoding()
+    if encoding == ZLIB_JSON:
+        return zip_str(df.to_json())
+    if encoding == JSON:
+        return {"encoding": JSON, "data": df.to_json()}
+    if encoding == ARROW:
+        return {
+            "encoding": ARROW,
+            "data": base64.b64encode(_arrow_dumps(df)).decode("ascii"),
+        }
+    raise ValueError(f"Unknown timeseries encoding: {encoding}")
+
+
+def decode_frame(v: Union[str, Dict[str, str]]) -> pd.DataFrame:
+    import pandas as pd
+
+    if isinstance(v, str):
+        return pd.read_json(StringIO(unzip_str(v)))
+    encoding = v.get("encoding")
+    if encoding == ARROW:
+        return _arrow_loads(base64.b64decode(v["data"]))
+    if encoding == JSON:
+        return pd.read_json(StringIO(v["data"]))
+    if encoding == ZLIB_JSON:
+        return pd.read_json(StringIO(unzip_str(v["data"])))
+    raise ValueError(f"Unknown timeseries encoding: {encoding}")
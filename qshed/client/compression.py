@@ -0,0 +1,52 @@
+import gzip
+import re
+from typing import Optional
+
+from . import config
+
+GZIP = "gzip"
+ZSTD = "zstd"
+IDENTITY = "identity"
+
+GZIP_LEVEL = 6
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("zstandard is required for zstd request bodies") from e
+    return zstandard
+
+
+def enabled() -> bool:
+    return config["compression"]["enabled"]
+
+
+def accept_encoding(supported: str) -> str:
+    """Accept-Encoding for a transport that can decode the `supported` encodings.
+
+    `supported` is the HTTP library's own default header, so only encodings it
+    can actually decode are advertised, in the configured order of preference.
+    """
+    if not enabled():
+        return IDENTITY
+    decodable = set(re.split(r",\s*", supported))
+    encodings = [e for e in config["compression"]["encodings"] if e in decodable]
+    return ", ".join(encodings) or IDENTITY
+
+
+def request_encoding(size: int) -> Optional[str]:
+    """Content-Encoding to send a body of `size` bytes with, if any."""
+    compression_config = config["compression"]
+    if not compression_config["enabled"] or size < compression_config["min_size"]:
+        return None
+    return compression_config["request_encoding"]
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == GZIP:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == ZSTD:
+        return _zstandard().ZstdCompressor().compress(body)
+    raise ValueError(f"Unknown content encoding: {encoding}")
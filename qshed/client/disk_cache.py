@@ -0,0 +1,216 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from .cache import CacheEntry
+from .utils import string_hash
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bodies (
+    hash TEXT PRIMARY KEY,
+    body TEXT NOT NULL,
+    nbytes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    expires REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_hash ON entries (hash);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    nbytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO usage (id, nbytes) SELECT 0, COALESCE(SUM(nbytes), 0) FROM bodies;
+CREATE TRIGGER IF NOT EXISTS bodies_insert AFTER INSERT ON bodies BEGIN
+    UPDATE usage SET nbytes = nbytes + new.nbytes WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS bodies_delete AFTER DELETE ON bodies BEGIN
+    UPDATE usage SET nbytes = nbytes - old.nbytes WHERE id = 0;
+END;
+"""
+
+DELETE_ORPHANS = "DELETE FROM bodies WHERE hash NOT IN (SELECT hash FROM entries)"
+
+
+class DiskCache:
+    """Response bodies in a SQLite database shared by the processes on a host.
+
+    Entries point at bodies stored once under their content hash, so identical
+    responses cached under different keys share storage. Expiry is kept in
+    wall clock time so entries survive restarts, and the least recently used
+    entries are evicted once the bodies exceed `max_bytes`. Concurrent
+    processes are serialised by SQLite (WAL journal, busy timeout).
+
+    Triggers keep a running total of the bodies' bytes, so writes under the
+    budget do not scan the table. Bodies no longer referenced by any entry
+    are only deleted once that total exceeds `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 256 * 1024 * 1024,
+        filename: str = "qshed-cache.sqlite",
+        timeout: float = 30,
+    ) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, filename)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.pid = None
+        self.connection = None
+        with self.lock:
+            # In one transaction, so the usage total and its triggers start together
+            self.connect().executescript(f"BEGIN IMMEDIATE; {SCHEMA} COMMIT;")
+
+    def connect(self) -> sqlite3.Connection:
+        # A connection inherited across fork (e.g. preloading workers) is unsafe
+        if self.pid != os.getpid():
+            self.connection = sqlite3.connect(
+                self.path,
+                timeout=self.timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.pid = os.getpid()
+        return self.connection
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            connection = self.connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    def lookup(self, key: str) -> Optional[CacheEntry]:
+        """Return the entry for `key`, expired or not, as a CacheEntry."""
+        with self.lock:
+            connection = self.connect()
+            # Reads run in autocommit mode; only hits take the write lock
+            row = connection.execute(
+                "SELECT e.expires, e.etag, e.last_modified, b.body FROM entries e "
+                "JOIN bodies b ON b.hash = e.hash WHERE e.key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+        expires, etag, last_modified, body = row
+        # CacheEntry expiry is on the monotonic clock
+        expires = time.monotonic() + expires - time.time()
+        return CacheEntry(body, len(body), expires, etag, last_modified)
+
+    def set(
+        self,
+        key: str,
+        value: str,
+        ttl: float,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        nbytes = len(value)
+        if nbytes > self.max_bytes:
+            return
+        body_hash = string_hash(value)
+        now = time.time()
+        with self.transaction() as connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO bodies (hash, body, nbytes) VALUES (?, ?, ?)",
+                (body_hash, value, nbytes),
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(key, hash, expires, etag, last_modified, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, body_hash, now + ttl, etag, last_modified, now),
+            )
+            self.evict(connection)
+
+    @staticmethod
+    def total_bytes(connection: sqlite3.Connection) -> int:
+        (total,) = connection.execute("SELECT nbytes FROM usage").fetchone()
+        return total
+
+    def evict(self, connection: sqlite3.Connection) -> None:
+        if self.total_bytes(connection) <= self.max_bytes:
+            return
+        connection.execute(DELETE_ORPHANS)
+        excess = self.total_bytes(connection) - self.max_bytes
+        if excess <= 0:
+            return
+        # Bodies are shared, so only the last entry using one frees its bytes
+        sizes, refs = {}, {}
+        for body_hash, nbytes, count in connection.execute(
+            "SELECT b.hash, b.nbytes, COUNT(*) FROM bodies b "
+            "JOIN entries e ON e.hash = b.hash GROUP BY b.hash"
+        ):
+            sizes[body_hash], refs[body_hash] = nbytes, count
+        doomed = []
+        for key, body_hash in connection.execute(
+            "SELECT key, hash FROM entries ORDER BY accessed"
+        ):
+            if excess <= 0:
+                break
+            doomed.append((key,))
+            refs[body_hash] -= 1
+            if not refs[body_hash]:
+                excess -= sizes[body_hash]
+        connection.executemany("DELETE FROM entries WHERE key = ?", doomed)
+        connection.execute(DELETE_ORPHANS)
+        self.evictions += len(doomed)
+
+    def refresh(self, key: str, ttl: float) -> None:
+        now = time.time()
+        with self.transaction() as connection:
+            connection.execute(
+                "UPDATE entries SET expires = ?, accessed = ? WHERE key = ?",
+                (now + ttl, now, key),
+            )
+
+    def invalidate(self, prefix: str = "") -> None:
+        with self.transaction() as connection:
+            connection.execute(
+                "DELETE FROM entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            )
+
+    def clear(self) -> None:
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM entries")
+            connection.execute("DELETE FROM bodies")
+
+    def stats(self) -> dict:
+        with self.lock:
+            entries, nbytes = (
+                self.connect()
+                .execute(
+                    "SELECT (SELECT COUNT(*) FROM entries), "
+                    "(SELECT nbytes FROM usage)"
+                )
+                .fetchone()
+            )
+        return {"entries": entries, "bytes": nbytes, "evictions": self.evictions}
+
+    def close(self) -> None:
+        with self.lock:
+            if self.connection is not None and self.pid == os.getpid():
+                self.connection.close()
+            self.connection = self.pid = None
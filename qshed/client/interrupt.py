@@ -0,0 +1,97 @@
+import socket
+import threading
+from typing import Optional
+
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+_local = threading.local()
+
+
+class InterruptibleRequest:
+    """A request sent on one thread that another thread can cut short.
+
+    While the request runs inside `with request:`, the connection it takes
+    from an InterruptibleAdapter's pool is recorded until it is returned.
+    `interrupt` shuts that connection down, so the blocked send fails at once
+    instead of waiting for the gateway to answer.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.conn = None
+        self.interrupted = False
+        self.finished = threading.Event()
+
+    def __enter__(self):
+        _local.request = self
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        _local.request = None
+        with self.lock:
+            self.conn = None
+            self.finished.set()
+
+    def attach(self, conn) -> None:
+        with self.lock:
+            self.conn = conn
+
+    def detach(self, conn) -> None:
+        with self.lock:
+            if self.conn is conn:
+                self.conn = None
+
+    def interrupt(self) -> bool:
+        """Cut the request short; False if it has already finished."""
+        with self.lock:
+            if self.finished.is_set():
+                return False
+            self.interrupted = True
+            sock = getattr(self.conn, "sock", None)
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        return True
+
+
+def current_request() -> Optional[InterruptibleRequest]:
+    """The InterruptibleRequest running on this thread, if any."""
+    return getattr(_local, "request", None)
+
+
+class InterruptiblePoolMixin:
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        request = current_request()
+        if request is not None:
+            request.attach(conn)
+        return conn
+
+    def _put_conn(self, conn) -> None:
+        # Once back in the pool the connection may serve another request
+        request = current_request()
+        if request is not None:
+            request.detach(conn)
+        super()._put_conn(conn)
+
+
+class InterruptibleHTTPConnectionPool(InterruptiblePoolMixin, HTTPConnectionPool):
+    pass
+
+
+class InterruptibleHTTPSConnectionPool(InterruptiblePoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class InterruptibleAdapter(HTTPAdapter):
+    """An HTTPAdapter whose requests can run as InterruptibleRequests."""
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": InterruptibleHTTPConnectionPool,
+            "https": InterruptibleHTTPSConnectionPool,
+        }
@@ -0,0 +1,119 @@
+import contextvars
+import logging
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Hashable, List, Sequence
+
+from .models import response as responseModels
+
+
+class DataLoader:
+    """Batch individual `load(key)` calls into one `batch_fn(keys)` call.
+
+    Keys requested within `wait` seconds of each other, up to `max_batch_size`,
+    are fetched together and each caller receives its own result. Inside a
+    `scope()` results are memoised, so repeated loads of a key are free. The
+    memo belongs to the scope: other threads, and asyncio tasks not started
+    within it, do not share it.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Hashable]], Sequence],
+        max_batch_size: int = 100,
+        wait: float = 0.005,
+    ) -> None:
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.wait = wait
+        self.lock = threading.Lock()
+        self.queue = []
+        self.timer = None
+        self.memo = contextvars.ContextVar(f"DataLoader.memo.{id(self)}", default=None)
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    @contextmanager
+    def scope(self):
+        if self.memo.get() is not None:
+            # Nested scopes share the outermost memo
+            yield self
+            return
+        token = self.memo.set({})
+        try:
+            yield self
+        finally:
+            self.memo.reset(token)
+
+    def forget(self, memo: dict, key: Hashable, future: Future) -> None:
+        # A failed load is retried by the next caller in the scope
+        if future.exception() is not None:
+            with self.lock:
+                if memo.get(key) is future:
+                    del memo[key]
+
+    def take_batch(self) -> list:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.queue = self.queue, []
+        return batch
+
+    def dispatch(self) -> None:
+        with self.lock:
+            batch = self.take_batch()
+        if batch:
+            self.run_batch(batch)
+
+    def run_batch(self, batch: list) -> None:
+        keys = list(dict.fromkeys(key for key, _ in batch))
+        self.logger.debug(f"Loading batch of {len(keys)}")
+        try:
+            rtn = self.batch_fn(keys)
+            if isinstance(rtn, responseModels.Error):
+                raise Exception(f"Error {rtn.code}: {rtn.message}")
+            results = self.match_results(keys, rtn)
+        except BaseException as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for key, future in batch:
+            future.set_result(results.get(key))
+
+    @staticmethod
+    def match_results(keys: list, rtn: Sequence) -> dict:
+        ids = [getattr(item, "id", None) for item in rtn]
+        if all(id is not None for id in ids):
+            return dict(zip(ids, rtn))
+        # Models without an id are assumed to come back in request order
+        if len(rtn) != len(keys):
+            raise Exception(f"Expected {len(keys)} results, received {len(rtn)}")
+        return dict(zip(keys, rtn))
+
+    def load_future(self, key: Hashable) -> Future:
+        batch = None
+        memo = self.memo.get()
+        with self.lock:
+            if memo is not None and key in memo:
+                return memo[key]
+            future = Future()
+            if memo is not None:
+                memo[key] = future
+                future.add_done_callback(lambda f: self.forget(memo, key, f))
+            self.queue.append((key, future))
+            if len(self.queue) >= self.max_batch_size:
+                batch = self.take_batch()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.wait, self.dispatch)
+                self.timer.daemon = True
+                self.timer.start()
+        if batch:
+            self.run_batch(batch)
+        return future
+
+    def load(self, key: Hashable):
+        return self.load_future(key).result()
+
+    def load_many(self, keys: Sequence[Hashable]) -> list:
+        futures = [self.load_future(key) for key in keys]
+        return [future.result() for future in futures]
@@ -0,0 +1,206 @@
+import bisect
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+Callback = Callable[[str, Dict[str, str], float], None]
+
+
+# Gateway paths with variable segments, and the route template they are counted under
+ROUTES = ((re.compile(r"datamodel/[^/]+/definition"), "datamodel/{name}/definition"),)
+
+
+def route(endpoint: str) -> str:
+    """The route template of a gateway path, so endpoint labels stay bounded."""
+    for pattern, template in ROUTES:
+        if pattern.fullmatch(endpoint):
+            return template
+    return endpoint
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total, rtn = 0, []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            rtn.append(("+Inf" if bound == float("inf") else repr(bound), total))
+        return rtn
+
+
+class Metrics:
+    """Client-side request metrics.
+
+    Latency histograms are kept per endpoint and phase: `network` is labelled
+    with the gateway route (see `route`), `decode` and `validation` with the module method
+    that parsed the response. Counters and gauges are keyed by endpoint.
+    Every observation is also passed to any registered callbacks, which is how
+    external systems (e.g. OpenTelemetryExporter) are fed; `prometheus()`
+    renders the current state in the Prometheus text format.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.histograms: Dict[Labels, Histogram] = {}
+        self.counters: Dict[str, Dict[Labels, float]] = defaultdict(
+            lambda: defaultdict(float)
+        )
+        self.gauges: Dict[str, Dict[Labels, float]] = defaultdict(
+            lambda: defaultdict(float)
+        )
+        self.callbacks: List[Callback] = []
+        self.sources: List[Callable[[], Dict[str, float]]] = []
+
+    def add_callback(self, callback: Callback) -> None:
+        self.callbacks.append(callback)
+
+    def add_source(self, source: Callable[[], Dict[str, float]]) -> None:
+        """Register a callable returning extra gauges, read at export time."""
+        self.sources.append(source)
+
+    def emit(self, name: str, labels: Dict[str, str], value: float) -> None:
+        for callback in self.callbacks:
+            callback(name, labels, value)
+
+    def observe(self, endpoint: str, phase: str, seconds: float) -> None:
+        key = (("endpoint", endpoint), ("phase", phase))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+        self.emit("qshed_client_latency_seconds", dict(key), seconds)
+
+    def inc(self, name: str, endpoint: str, value: float = 1) -> None:
+        key = (("endpoint", endpoint),)
+        with self.lock:
+            self.counters[name][key] += value
+        self.emit(name, dict(key), value)
+
+    def add_gauge(self, name: str, endpoint: str, value: float) -> None:
+        key = (("endpoint", endpoint),)
+        with self.lock:
+            self.gauges[name][key] += value
+            current = self.gauges[name][key]
+        self.emit(name, dict(key), current)
+
+    @contextmanager
+    def timed(self, endpoint: str, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(endpoint, phase, time.perf_counter() - start)
+
+    @contextmanager
+    def request(self, endpoint: str, sent_bytes: int = 0):
+        """Time a gateway request and track it as in flight while it runs."""
+        self.inc("qshed_client_requests_total", endpoint)
+        if sent_bytes:
+            self.inc("qshed_client_request_bytes_total", endpoint, sent_bytes)
+        self.add_gauge("qshed_client_requests_in_flight", endpoint, 1)
+        try:
+            with self.timed(endpoint, "network"):
+                yield
+        except Exception:
+            self.inc("qshed_client_errors_total", endpoint)
+            raise
+        finally:
+            self.add_gauge("qshed_client_requests_in_flight", endpoint, -1)
+
+    def response(self, endpoint: str, received_bytes: int, ok: bool) -> None:
+        self.inc("qshed_client_response_bytes_total", endpoint, received_bytes)
+        if not ok:
+            self.inc("qshed_client_errors_total", endpoint)
+
+    @staticmethod
+    def format_labels(labels: Labels, extra: Optional[Tuple] = None) -> str:
+        items = list(labels) + ([extra] if extra else [])
+        inner = ",".join(f'{k}="{_escape(v)}"' for k, v in items)
+        return "{" + inner + "}" if inner else ""
+
+    def prometheus(self) -> str:
+        lines = []
+        with self.lock:
+            if self.histograms:
+                lines.append("# TYPE qshed_client_latency_seconds histogram")
+            for labels, histogram in sorted(self.histograms.items()):
+                for bound, count in histogram.cumulative():
+                    lines.append(
+                        "qshed_client_latency_seconds_bucket"
+                        f"{self.format_labels(labels, ('le', bound))} {count}"
+                    )
+                lines.append(
+                    f"qshed_client_latency_seconds_sum{self.format_labels(labels)} "
+                    f"{histogram.sum}"
+                )
+                lines.append(
+                    f"qshed_client_latency_seconds_count{self.format_labels(labels)} "
+                    f"{histogram.count}"
+                )
+            for kind, families in (("counter", self.counters), ("gauge", self.gauges)):
+                for name, values in sorted(families.items()):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for labels, value in sorted(values.items()):
+                        lines.append(f"{name}{self.format_labels(labels)} {value}")
+        for source in self.sources:
+            for name, value in sorted(source().items()):
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class OpenTelemetryExporter:
+    """Metrics callback recording observations on an OpenTelemetry meter.
+
+    metrics.add_callback(OpenTelemetryExporter(meter_provider.get_meter("qshed")))
+    """
+
+    def __init__(self, meter) -> None:
+        self.meter = meter
+        self.instruments = {}
+        self.last_gauge = defaultdict(float)
+
+    def instrument(self, name: str):
+        if name not in self.instruments:
+            if name == "qshed_client_latency_seconds":
+                instrument = self.meter.create_histogram(name, unit="s")
+            elif name.endswith("_in_flight"):
+                instrument = self.meter.create_up_down_counter(name)
+            else:
+                instrument = self.meter.create_counter(name)
+            self.instruments[name] = instrument
+        return self.instruments[name]
+
+    def __call__(self, name: str, labels: Dict[str, str], value: float) -> None:
+        instrument = self.instrument(name)
+        if name == "qshed_client_latency_seconds":
+            instrument.record(value, attributes=labels)
+        elif name.endswith("_in_flight"):
+            # Gauges are emitted as their current value; OTel wants the change
+            key = (name, tuple(sorted(labels.items())))
+            instrument.add(value - self.last_gauge[key], attributes=labels)
+            self.last_gauge[key] = value
+        else:
+            instrument.add(value, attributes=labels)
@@ -1,13 +1,10 @@
 from __future__ import annotations
 
-import json
-import yaml
-import pandas as pd
 from datetime import datetime
 from typing import Dict, Optional, List, Any, Callable
 from pydantic import BaseModel, Field, validator, create_model  # , computed_field
 
-from ..utils import string_hash, zip_str, unzip_str
+from ..utils import string_hash, json_loads, json_dumps, flatten_frame, validate_frame
 
 type_map = {
     str: "string",
@@ -19,7 +16,13 @@ type_map = {
 class QShedModel(BaseModel):
     _is_error = False
 
+    class Config:
+        json_loads = json_loads
+        json_dumps = json_dumps
+
     def yaml(self) -> str:
+        import yaml
+
         return yaml.dump(self.dict())
 
 
@@ -46,6 +49,19 @@ class DataModel(BaseModel):
             ]
         )
 
+    @classmethod
+    def validate_frame(cls, df):
+        """Check a DataFrame of records against this model a column at a time.
+
+        Much faster than building one model per row; returns the model's
+        columns coerced to their types, or raises ValueError.
+        """
+        fields = {
+            name: (type_map[field.type_], field.required, field.allow_none)
+            for name, field in cls.__fields__.items()
+        }
+        return validate_frame(df, fields, name=cls.__name__)
+
     
 
 
@@ -62,25 +78,18 @@ class DataModelDefinition(BaseModel):
     name: str
     attributes: list[DataModelAttribute]
 
+    @property
+    def hash(self) -> str:
+        return string_hash(self.json())
 
-def ts_json_loads(v):
-    dic = json.loads(v)
-    dic["data"] = pd.read_json(unzip_str(dic["data"]))
-    return dic
-
-
-class Timeseries(QShedModel):
-    name: str
-    data: pd.DataFrame
-    entity: Optional[int]
-    id: Optional[int] = None
-    start: Optional[datetime] = None
-    end: Optional[datetime] = None
-
-    class Config:
-        arbitrary_types_allowed = True
-        json_encoders = {pd.DataFrame: lambda df: zip_str(df.to_json())}
-        json_loads = ts_json_loads
+    def to_model(self) -> type[DataModel]:
+        types = {v: k for k, v in type_map.items()}
+        for attr in self.attributes:
+            if attr.type not in types:
+                raise ValueError(f"Unknown type {attr.type} for attribute {attr.name}")
+        # Not through create_definition, whose `name` argument an attribute may share
+        fields = {attr.name: (types[attr.type], ...) for attr in self.attributes}
+        return create_model(self.name, __base__=DataModel, **fields)
 
 
 class CollectionDatabase(QShedModel):
@@ -97,3 +106,18 @@ class Collection(QShedModel):
     id: Optional[int] = None
     query: Optional[Dict] = Field({})
     limit: Optional[int] = None
+    skip: Optional[int] = None
+    cursor: Optional[str] = None
+
+    def to_dataframe(self, columns: Optional[List[str]] = None, **kwargs):
+        """Flatten the collection's documents into a DataFrame, see flatten_frame."""
+        return flatten_frame(self.data or [], columns=columns, **kwargs)
+
+
+def __getattr__(name):
+    # Timeseries models need pandas; only import it once they are used
+    if name in ("Timeseries", "ts_json_loads"):
+        from . import timeseries
+
+        return getattr(timeseries, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
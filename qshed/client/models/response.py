@@ -1,12 +1,10 @@
-import json
-import pandas as pd
 from typing import Generic, TypeVar, Optional, List
 
 from pydantic import BaseModel, validator, ValidationError
 from pydantic.generics import GenericModel
 
 from . import data as dataModels
-from ..utils import zip_str, unzip_str
+from ..utils import json_loads, json_dumps
 
 
 DataType = TypeVar("DataType")
@@ -22,6 +20,10 @@ class Response(GenericModel, Generic[DataType]):
     data: Optional[DataType]
     error: Optional[Error]
 
+    class Config:
+        json_loads = json_loads
+        json_dumps = json_dumps
+
     @validator("error", always=True)
     def check_consistency(cls, v, values):
         if v is not None and values["data"] is not None:
@@ -39,34 +41,24 @@ EntityResponse = Response[dataModels.Entity]
 EntityListResponse = Response[List[dataModels.Entity]]
 
 
-def ts_response_json_loads(v):
-    dic = json.loads(v)
-    dic["data"]["data"] = pd.read_json(unzip_str(dic["data"]["data"]))
-    return dic
-
-
-def ts_list_response_json_loads(v):
-    dic = json.loads(v)
-    for ts in dic["data"]:
-        ts["data"] = pd.read_json(unzip_str(ts["data"]))
-    return dic
-
+CollectionResponse = Response[dataModels.Collection]
+CollectionListResponse = Response[List[dataModels.Collection]]
+CollectionDatabaseResponse = Response[dataModels.CollectionDatabase]
+CollectionDatabaseListResponse = Response[List[dataModels.CollectionDatabase]]
 
-class TimeseriesResponse(Response[dataModels.Timeseries]):
-    class Config:
-        arbitrary_types_allowed = True
-        json_encoders = {pd.DataFrame: lambda df: zip_str(df.to_json())}
-        json_loads = ts_response_json_loads
 
+DataModelDefinitionResponse = Response[dataModels.DataModelDefinition]
 
-class TimeseriesListResponse(Response[List[dataModels.Timeseries]]):
-    class Config:
-        arbitrary_types_allowed = True
-        json_encoders = {pd.DataFrame: lambda df: zip_str(df.to_json())}
-        json_loads = ts_list_response_json_loads
 
+def __getattr__(name):
+    # Timeseries responses need pandas; only import it once they are used
+    if name in (
+        "TimeseriesResponse",
+        "TimeseriesListResponse",
+        "ts_response_json_loads",
+        "ts_list_response_json_loads",
+    ):
+        from . import timeseries
 
-CollectionResponse = Response[dataModels.Collection]
-CollectionListResponse = Response[List[dataModels.Collection]]
-CollectionDatabaseResponse = Response[dataModels.CollectionDatabase]
-CollectionDatabaseListResponse = Response[List[dataModels.CollectionDatabase]]
+        return getattr(timeseries, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,254 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from .data import QShedModel
+from .response import Response
+from .. import config
+from ..codecs import encode_frame, decode_frame
+from ..utils import json_loads, downcast_frame
+
+
+class CompactFrame:
+    """A timeseries frame held as one contiguous array per column plus the index.
+
+    Drops the DataFrame and BlockManager wrapping, and the chain of views a
+    decoded frame keeps alive, which dominate the size of short series. The
+    index is stored as naive UTC values with its timezone alongside.
+    """
+
+    __slots__ = ("index", "index_name", "tz", "columns", "arrays")
+
+    def __init__(self, index, index_name, tz, columns: list, arrays: list) -> None:
+        self.index = index
+        self.index_name = index_name
+        self.tz = tz
+        self.columns = columns
+        self.arrays = arrays
+
+    @classmethod
+    def from_frame(
+        cls,
+        df: pd.DataFrame,
+        downcast: bool = False,
+        category_threshold: float = 0.5,
+    ) -> "CompactFrame":
+        if downcast:
+            # Shallow copy, so the caller's frame keeps its columns
+            df = downcast_frame(df.copy(deep=False), category_threshold)
+        arrays = []
+        for _, column in df.items():
+            values = column.values
+            if isinstance(values, np.ndarray):
+                # An owned copy, rather than a view into the frame's 2D block
+                values = np.array(values, order="C")
+            arrays.append(values)
+        index = np.array(df.index.values, order="C")
+        tz = getattr(df.index, "tz", None)
+        return cls(index, df.index.name, tz, list(df.columns), arrays)
+
+    def to_frame(self) -> pd.DataFrame:
+        index = pd.Index(self.index, name=self.index_name)
+        if self.tz is not None:
+            index = index.tz_localize("UTC").tz_convert(self.tz)
+        return pd.DataFrame(dict(zip(self.columns, self.arrays)), index=index)
+
+    @property
+    def nbytes(self) -> int:
+        return self.index.nbytes + sum(array.nbytes for array in self.arrays)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __repr__(self) -> str:
+        return (
+            f"CompactFrame(rows={len(self)}, columns={self.columns}, "
+            f"nbytes={self.nbytes})"
+        )
+
+
+frame_encoders = {
+    pd.DataFrame: encode_frame,
+    CompactFrame: lambda v: encode_frame(v.to_frame()),
+}
+
+
+def compact_frame(
+    df: pd.DataFrame, compact_config: Optional[dict] = None
+) -> Union[pd.DataFrame, CompactFrame]:
+    if compact_config is None:
+        compact_config = config["timeseries"]["compact"]
+    if not compact_config["enabled"]:
+        return df
+    return CompactFrame.from_frame(
+        df, compact_config["downcast"], compact_config["category_threshold"]
+    )
+
+
+def ts_json_loads(v):
+    dic = json_loads(v)
+    dic["data"] = compact_frame(decode_frame(dic["data"]))
+    return dic
+
+
+class Timeseries(QShedModel):
+    name: str
+    data: Union[pd.DataFrame, CompactFrame]
+    entity: Optional[int]
+    id: Optional[int] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+        json_encoders = frame_encoders
+        json_loads = ts_json_loads
+
+    def __getattribute__(self, name):
+        value = super().__getattribute__(name)
+        if name == "data" and type(value) is CompactFrame:
+            # Decoded data stays compact until it is first used as a DataFrame
+            value = self.__dict__["data"] = value.to_frame()
+        return value
+
+    def __iter__(self):
+        # dict(ts), like .data, sees the DataFrame
+        self.data
+        return super().__iter__()
+
+    def _iter(self, *args, **kwargs):
+        # Behind .dict(), .json() and .copy()
+        self.data
+        return super()._iter(*args, **kwargs)
+
+    def compact(
+        self, downcast: bool = False, category_threshold: float = 0.5
+    ) -> "Timeseries":
+        """Release the DataFrame, keeping the data as a CompactFrame."""
+        data = self.__dict__["data"]
+        if type(data) is CompactFrame:
+            if not downcast:
+                return self
+            data = data.to_frame()
+        self.__dict__["data"] = CompactFrame.from_frame(
+            data, downcast, category_threshold
+        )
+        return self
+
+    @property
+    def nbytes(self) -> int:
+        data = self.__dict__["data"]
+        if type(data) is CompactFrame:
+            return data.nbytes
+        return int(data.memory_usage(index=True, deep=True).sum())
+
+
+def ts_response_json_loads(v):
+    dic = json_loads(v)
+    dic["data"]["data"] = compact_frame(decode_frame(dic["data"]["data"]))
+    return dic
+
+
+_decode_pools = {}
+_decode_pools_lock = threading.Lock()
+
+
+def decode_pool(kind: str, workers: int):
+    """The shared thread or process pool used to decode series."""
+    with _decode_pools_lock:
+        pool = _decode_pools.get((kind, workers))
+        if pool is None:
+            if kind == "thread":
+                pool = ThreadPoolExecutor(workers, thread_name_prefix="qshed-decode")
+            elif kind == "process":
+                # Forking a process running client threads is unsafe
+                context = multiprocessing.get_context("spawn")
+                pool = ProcessPoolExecutor(workers, mp_context=context)
+            else:
+                raise ValueError(f"Unknown parallel decode: {kind}")
+            _decode_pools[(kind, workers)] = pool
+    return pool
+
+
+def shutdown_decode_pools() -> None:
+    with _decode_pools_lock:
+        for pool in _decode_pools.values():
+            pool.shutdown(cancel_futures=True)
+        _decode_pools.clear()
+
+
+def decode_chunk(values: list, compact_config: dict) -> list:
+    # Runs in the decode pool; config is passed in as process workers have their own
+    return [compact_frame(decode_frame(v), compact_config) for v in values]
+
+
+def decode_frames(series: list, size: int) -> None:
+    """Decode, in place, the "data" of each series of a list response of
+    `size` characters.
+
+    With timeseries.decode.parallel set, responses of at least min_bytes are
+    decoded chunk_size series at a time on a thread or process pool. Each
+    encoded frame is dropped once submitted and at most two chunks per worker
+    are in flight, which bounds the memory held by their intermediate text.
+    """
+    decode_config = config["timeseries"]["decode"]
+    compact_config = dict(config["timeseries"]["compact"])
+    parallel = decode_config["parallel"]
+    chunk_size = decode_config["chunk_size"]
+    if not parallel or size < decode_config["min_bytes"] or len(series) <= chunk_size:
+        for ts in series:
+            ts["data"] = compact_frame(decode_frame(ts["data"]), compact_config)
+        return
+
+    workers = decode_config["workers"] or os.cpu_count()
+    pool = decode_pool(parallel, workers)
+    pending = deque()
+
+    def collect():
+        chunk, future = pending.popleft()
+        for ts, frame in zip(chunk, future.result()):
+            ts["data"] = frame
+
+    try:
+        for start in range(0, len(series), chunk_size):
+            chunk = series[start : start + chunk_size]
+            values = [ts["data"] for ts in chunk]
+            for ts in chunk:
+                ts["data"] = None
+            pending.append((chunk, pool.submit(decode_chunk, values, compact_config)))
+            del values
+            if len(pending) >= 2 * workers:
+                collect()
+        while pending:
+            collect()
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+def ts_list_response_json_loads(v):
+    dic = json_loads(v)
+    # Error responses carry no data
+    decode_frames(dic["data"] or [], len(v))
+    return dic
+
+
+class TimeseriesResponse(Response[Timeseries]):
+    class Config:
+        arbitrary_types_allowed = True
+        json_encoders = frame_encoders
+        json_loads = ts_response_json_loads
+
+
+class TimeseriesListResponse(Response[List[Timeseries]]):
+    class Config:
+        arbitrary_types_allowed = True
+        json_encoders = frame_encoders
+        json_loads = ts_list_response_json_loads
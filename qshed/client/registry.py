@@ -0,0 +1,65 @@
+import logging
+import threading
+from typing import Callable, Optional, Type
+
+from .models.data import DataModel, DataModelDefinition
+from .utils import SingleFlight
+
+
+class DataModelRegistry:
+    """Model classes for the gateway's DataModel definitions, built once.
+
+    Each name's definition is fetched through `fetch` the first time it is
+    asked for. Classes are cached under the definition's hash, so re-fetching
+    an unchanged definition after `invalidate`, or another name with the same
+    definition, reuses the class instead of calling create_model again.
+    """
+
+    def __init__(self, fetch: Callable[[str], DataModelDefinition]) -> None:
+        self.fetch = fetch
+        self.lock = threading.Lock()
+        self.hashes = {}
+        self.models = {}
+        self.flight = SingleFlight()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def cached(self, name: str) -> Optional[Type[DataModel]]:
+        """The class for `name` if its definition is held, without fetching."""
+        with self.lock:
+            definition_hash = self.hashes.get(name)
+            if definition_hash is not None:
+                return self.models[definition_hash]
+        return None
+
+    def get(self, name: str) -> Type[DataModel]:
+        model = self.cached(name)
+        if model is not None:
+            return model
+        # Concurrent first lookups of a name share one fetch
+        return self.flight.do(name, self.load, name)
+
+    def load(self, name: str) -> Type[DataModel]:
+        self.logger.debug(f"Fetching definition of {name}")
+        return self.register(self.fetch(name), name)
+
+    def register(
+        self, definition: DataModelDefinition, name: Optional[str] = None
+    ) -> Type[DataModel]:
+        definition_hash = definition.hash
+        with self.lock:
+            model = self.models.get(definition_hash)
+            if model is None:
+                model = self.models[definition_hash] = definition.to_model()
+            self.hashes[name or definition.name] = definition_hash
+        return model
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """Fetch `name` (default every name) again on its next lookup."""
+        with self.lock:
+            if name is None:
+                self.hashes.clear()
+            else:
+                self.hashes.pop(name, None)
+
+    def validate_frame(self, name: str, df):
+        return self.get(name).validate_frame(df)
@@ -0,0 +1,85 @@
+import logging
+import os
+from collections.abc import Mapping
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CONFIG_ENV_VAR = "QSHED_CONFIG"
+DEFAULT_CONFIG_FILE = os.path.join(os.path.dirname(__file__), "config.yml")
+
+
+def load_env_file(env_file: str = ".env") -> None:
+    if not os.path.exists(env_file):
+        return
+    try:
+        from dotenv import load_dotenv
+
+        load_dotenv(env_file)
+        logger.info(f"Loaded environment file: {env_file}")
+    except Exception as e:
+        logger.warning(f"{e} - Unable to load environment file: {env_file}")
+
+
+def resolve_config_file(config_file: Optional[str] = None) -> str:
+    """Pick the config file: explicit path, $QSHED_CONFIG, ./config.yml, packaged.
+
+    Any file but the packaged one is layered over the packaged defaults.
+    """
+    if config_file:
+        return config_file
+    if os.environ.get(CONFIG_ENV_VAR):
+        return os.environ[CONFIG_ENV_VAR]
+    if os.path.exists("config.yml"):
+        return "config.yml"
+    return DEFAULT_CONFIG_FILE
+
+
+def merge_config(base: dict, override: dict) -> dict:
+    """`override` laid over `base`, merging nested sections key by key."""
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            value = merge_config(merged[key], value)
+        merged[key] = value
+    return merged
+
+
+class Config(Mapping):
+    """Client configuration, read from disk on first access rather than import."""
+
+    def __init__(self) -> None:
+        self.data = None
+        self.path = None
+
+    def load(self, config_file: Optional[str] = None) -> dict:
+        import yaml
+
+        load_env_file()
+        self.path = resolve_config_file(config_file)
+        with open(DEFAULT_CONFIG_FILE, "r") as f:
+            self.data = yaml.safe_load(f)
+        if self.path != DEFAULT_CONFIG_FILE:
+            # Sections and keys missing from the user's file keep their defaults
+            with open(self.path, "r") as f:
+                self.data = merge_config(self.data, yaml.safe_load(f) or {})
+        logger.debug(f"Loaded config file: {self.path}")
+        return self.data
+
+    @property
+    def loaded(self) -> dict:
+        if self.data is None:
+            self.load()
+        return self.data
+
+    def __getitem__(self, key):
+        return self.loaded[key]
+
+    def __iter__(self):
+        return iter(self.loaded)
+
+    def __len__(self) -> int:
+        return len(self.loaded)
+
+
+config = Config()
@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+Interval = Tuple[datetime, datetime]
+
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def interval_gaps(intervals: List[Interval], start: datetime, end: datetime):
+    gaps = []
+    cursor = start
+    for held_start, held_end in intervals:
+        if held_end <= cursor:
+            continue
+        if held_start >= end:
+            break
+        if held_start > cursor:
+            gaps.append((cursor, held_start))
+        cursor = max(cursor, held_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def _index_bound(index: pd.Index, when: datetime) -> pd.Timestamp:
+    when = pd.Timestamp(when)
+    tz = getattr(index, "tz", None)
+    if tz is not None and when.tzinfo is None:
+        # Request bounds are naive UTC, as sent to the gateway
+        when = when.tz_localize("UTC")
+    return when
+
+
+class SeriesEntry:
+    def __init__(
+        self, frame: Optional[pd.DataFrame] = None, intervals: List[Interval] = None
+    ) -> None:
+        self.frame = frame if frame is not None else pd.DataFrame()
+        self.intervals = intervals or []
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.frame.memory_usage(index=True, deep=True).sum())
+
+    def add(self, start: datetime, end: datetime, df: pd.DataFrame) -> None:
+        if not df.empty:
+            frame = pd.concat([self.frame, df]) if not self.frame.empty else df
+            frame = frame[~frame.index.duplicated(keep="last")]
+            self.frame = frame.sort_index()
+        self.intervals = merge_intervals(self.intervals + [(start, end)])
+
+    def select(self, start: datetime, end: datetime) -> pd.DataFrame:
+        if self.frame.empty:
+            return self.frame
+        index = self.frame.index
+        mask = (index >= _index_bound(index, start)) & (
+            index <= _index_bound(index, end)
+        )
+        return self.frame[mask]
+
+
+class TimeseriesStore:
+    """Per-series local store of timeseries data and the intervals it covers.
+
+    Series are kept in memory up to `max_bytes` and evicted least recently used
+    first. With `disk_dir` set, evicted series are written to parquet and read
+    back on their next access instead of being dropped.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None) -> None:
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.RLock()
+        self.logger = logging.getLogger(self.__class__.__name__)
+        if disk_dir is not None:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_paths(self, id: int):
+        base = os.path.join(self.disk_dir, str(id))
+        return base + ".parquet", base + ".json"
+
+    def _spill(self, id: int, entry: SeriesEntry) -> None:
+        frame_path, intervals_path = self._disk_paths(id)
+        entry.frame.to_parquet(frame_path)
+        with open(intervals_path, "w") as intervals_file:
+            json.dump(
+                [(s.isoformat(), e.isoformat()) for s, e in entry.intervals],
+                intervals_file,
+            )
+
+    def _load(self, id: int) -> Optional[SeriesEntry]:
+        if self.disk_dir is None:
+            return None
+        frame_path, intervals_path = self._disk_paths(id)
+        if not os.path.exists(intervals_path):
+            return None
+        with open(intervals_path) as intervals_file:
+            intervals = [
+                (datetime.fromisoformat(s), datetime.fromisoformat(e))
+                for s, e in json.load(intervals_file)
+            ]
+        return SeriesEntry(pd.read_parquet(frame_path), intervals)
+
+    def _entry(self, id: int) -> SeriesEntry:
+        entry = self.entries.get(id)
+        if entry is None:
+            entry = self._load(id) or SeriesEntry()
+            self.entries[id] = entry
+            self.nbytes += entry.nbytes
+        self.entries.move_to_end(id)
+        # A series read back from disk may push others out in turn
+        self._evict()
+        return entry
+
+    def _evict(self) -> None:
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+            id, entry = self.entries.popitem(last=False)
+            self.nbytes -= entry.nbytes
+            self.logger.debug(f"Evicting timeseries {id} ({entry.nbytes} bytes)")
+            if self.disk_dir is not None:
+                self._spill(id, entry)
+
+    def missing(self, id: int, start: datetime, end: datetime) -> List[Interval]:
+        with self.lock:
+            return interval_gaps(self._entry(id).intervals, start, end)
+
+    def add(self, id: int, start: datetime, end: datetime, df: pd.DataFrame) -> None:
+        with self.lock:
+            entry = self._entry(id)
+            self.nbytes -= entry.nbytes
+            entry.add(start, end, df)
+            self.nbytes += entry.nbytes
+            self._evict()
+
+    def select(self, id: int, start: datetime, end: datetime) -> pd.DataFrame:
+        with self.lock:
+            return self._entry(id).select(start, end)
+
+    def clear(self, id: Optional[int] = None) -> None:
+        with self.lock:
+            ids = list(self.entries) if id is None else [id]
+            if id is None and self.disk_dir is not None:
+                ids += [
+                    int(name.split(".")[0])
+                    for name in os.listdir(self.disk_dir)
+                    if name.endswith(".json")
+                ]
+            for key in ids:
+                entry = self.entries.pop(key, None)
+                if entry is not None:
+                    self.nbytes -= entry.nbytes
+                if self.disk_dir is not None:
+                    for path in self._disk_paths(key):
+                        if os.path.exists(path):
+                            os.remove(path)
@@ -0,0 +1,236 @@
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Iterator, Optional
+
+_decoder = json.JSONDecoder()
+_whitespace = " \t\n\r"
+
+
+class _Incomplete(Exception):
+    """The text fed so far ends before the current value."""
+
+
+class JsonStream:
+    """Incremental reader over a JSON document arriving as text chunks.
+
+    Text is added with `feed` and ended with `close`. Only the unconsumed tail
+    of the text is buffered, so values can be pulled out one at a time without
+    holding the whole document. A read that needs text not yet fed raises
+    _Incomplete without consuming anything, to be retried after the next feed.
+    """
+
+    def __init__(self) -> None:
+        self.buffer = ""
+        self.pos = 0
+        # Chunks fed but not yet joined onto the buffer
+        self.pending = []
+        self.pending_size = 0
+        self.done = False
+        # Text available when the value being read was last tried
+        self.attempted = 0
+
+    def feed(self, chunk: str) -> None:
+        if chunk:
+            self.pending.append(chunk)
+            self.pending_size += len(chunk)
+
+    def close(self) -> None:
+        self.done = True
+
+    def join(self) -> None:
+        if self.pending:
+            self.buffer = self.buffer[self.pos :] + "".join(self.pending)
+            self.pos = 0
+            self.pending = []
+            self.pending_size = 0
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _whitespace:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.pending:
+                if self.done:
+                    raise ValueError("Unexpected end of JSON stream")
+                raise _Incomplete
+            self.join()
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in JSON stream, found {found!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        available = len(self.buffer) - self.pos + self.pending_size
+        # A value spanning many chunks is only retried once the text has
+        # doubled, keeping the total decode work linear in its size
+        if self.done or available >= 2 * self.attempted:
+            self.join()
+            self.attempted = available
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # A number or literal at the very end may be cut short
+                if end < len(self.buffer) or self.done:
+                    self.pos = end
+                    self.attempted = 0
+                    return value
+            except json.JSONDecodeError:
+                if self.done:
+                    raise
+        raise _Incomplete
+
+
+class ResponseDataParser:
+    """The elements of a `{"data": [...], "error": ...}` response, parsed as
+    its text is fed in.
+
+    `feed` and `close` return the elements completed by that text. An error
+    in the response raises once it is reached.
+    """
+
+    def __init__(self) -> None:
+        self.stream = JsonStream()
+        self.key = None
+        # The next step; each consumes text only once it has all it needs
+        self.step = self.open
+
+    def feed(self, chunk: str) -> list:
+        self.stream.feed(chunk)
+        return self.parse()
+
+    def close(self) -> list:
+        self.stream.close()
+        items = self.parse()
+        if self.step is not None:
+            raise ValueError("Unexpected end of JSON stream")
+        return items
+
+    def parse(self) -> list:
+        items = []
+        try:
+            while self.step is not None:
+                self.step(items)
+        except _Incomplete:
+            pass
+        return items
+
+    def open(self, items: list) -> None:
+        self.stream.expect("{")
+        self.step = self.member
+
+    def member(self, items: list) -> None:
+        if self.stream.peek() == "}":
+            self.stream.expect("}")
+            self.step = None
+            return
+        self.key = self.stream.value()
+        self.step = self.colon
+
+    def colon(self, items: list) -> None:
+        self.stream.expect(":")
+        self.step = self.member_value
+
+    def member_value(self, items: list) -> None:
+        if self.key == "data" and self.stream.peek() == "[":
+            self.stream.expect("[")
+            self.step = self.first_item
+            return
+        value = self.stream.value()
+        if self.key == "error" and value is not None:
+            raise Exception(f"Error {value.get('code')}: {value.get('message')}")
+        self.step = self.separator
+
+    def first_item(self, items: list) -> None:
+        if self.stream.peek() == "]":
+            self.stream.expect("]")
+            self.step = self.separator
+        else:
+            self.step = self.item
+
+    def item(self, items: list) -> None:
+        items.append(self.stream.value())
+        self.step = self.after_item
+
+    def after_item(self, items: list) -> None:
+        if self.stream.peek() == "]":
+            self.stream.expect("]")
+            self.step = self.separator
+        else:
+            self.stream.expect(",")
+            self.step = self.item
+
+    def separator(self, items: list) -> None:
+        if self.stream.peek() == ",":
+            self.stream.expect(",")
+        self.step = self.member
+
+
+def iter_response_data(chunks: Iterable[str]) -> Iterator[Any]:
+    """Yield the elements of a streamed `{"data": [...], "error": ...}` response."""
+    parser = ResponseDataParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+async def aiter_response_data(chunks: AsyncIterable[str]) -> AsyncIterator:
+    """Async counterpart of stream.iter_response_data."""
+    parser = ResponseDataParser()
+    async for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield item
+    for item in parser.close():
+        yield item
+
+
+class ServerSentEvent:
+    __slots__ = ("event", "data", "id", "retry")
+
+    def __init__(
+        self,
+        event: str = "message",
+        data: str = "",
+        id: Optional[str] = None,
+        retry: Optional[int] = None,
+    ) -> None:
+        self.event = event
+        self.data = data
+        self.id = id
+        self.retry = retry
+
+    def __repr__(self) -> str:
+        return f"ServerSentEvent(event={self.event!r}, id={self.id!r})"
+
+
+def iter_events(chunks: Iterable[str]) -> Iterator[ServerSentEvent]:
+    """Parse a text/event-stream arriving as text chunks.
+
+    Comment lines (keep-alives) are skipped. Each event carries the last event
+    id seen so far, as a reconnecting client should send in Last-Event-ID.
+    """
+    buffer = ""
+    event, data, id, retry = "message", [], None, None
+    for chunk in chunks:
+        *lines, buffer = (buffer + chunk).split("\n")
+        for line in lines:
+            line = line.rstrip("\r")
+            if not line:
+                if data or retry is not None:
+                    yield ServerSentEvent(event, "\n".join(data), id, retry)
+                event, data, retry = "message", [], None
+                continue
+            if line.startswith(":"):
+                continue
+            field, _, value = line.partition(":")
+            if value.startswith(" "):
+                value = value[1:]
+            if field == "event":
+                event = value
+            elif field == "data":
+                data.append(value)
+            elif field == "id":
+                id = value
+            elif field == "retry" and value.isdigit():
+                retry = int(value)
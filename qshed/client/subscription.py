@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+from typing import Callable, Iterator, Optional
+
+import requests
+
+from . import config
+from .stream import ServerSentEvent, iter_events
+
+
+class Subscription:
+    """Deltas pushed by the gateway over a server-sent events stream.
+
+    Iterating yields each event as parsed by `parse`, skipping those it maps
+    to None. When the stream drops it is reopened after `retry` seconds
+    (doubling up to `max_retry` while attempts keep failing, or as hinted by
+    the gateway) with the id of the last event received, so the gateway
+    resumes from there and no delta is lost or repeated. The stream is also
+    reopened when the gateway answers 5xx or 429; other error statuses end
+    the iteration with a requests.HTTPError.
+
+        with client.subscribe(timeseries_ids=[1, 2]) as subscription:
+            for delta in subscription:
+                ...
+    """
+
+    def __init__(
+        self,
+        comms,
+        url_ext: str,
+        params: dict,
+        parse: Callable[[ServerSentEvent], object],
+        last_event_id: Optional[str] = None,
+    ) -> None:
+        subscribe_config = config["subscribe"]
+        self.comms = comms
+        self.url_ext = url_ext
+        self.params = params
+        self.parse = parse
+        self.last_event_id = last_event_id
+        self.retry = subscribe_config["retry"]
+        self.max_retry = subscribe_config["max_retry"]
+        self.timeout = (
+            config["transport"]["timeout"]["connect"],
+            subscribe_config["read_timeout"],
+        )
+        self.reconnects = 0
+        self.response = None
+        self.closed = False
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def connect(self) -> requests.Response:
+        headers = {"Accept": "text/event-stream", "Cache-Control": "no-cache"}
+        if self.last_event_id is not None:
+            headers["Last-Event-ID"] = self.last_event_id
+        response = self.comms.open_stream(
+            self.url_ext, self.params, headers=headers, timeout=self.timeout
+        )
+        with self.lock:
+            if self.closed:
+                response.close()
+            self.response = response
+        return response
+
+    def events(self) -> Iterator[ServerSentEvent]:
+        with self.connect() as response:
+            # chunk_size=None hands over each chunk as soon as it arrives
+            yield from iter_events(
+                response.iter_content(chunk_size=None, decode_unicode=True)
+            )
+
+    def __iter__(self) -> Iterator:
+        delay = self.retry
+        while not self.closed:
+            try:
+                for event in self.events():
+                    if event.retry is not None:
+                        self.retry = delay = event.retry / 1000
+                    if event.id is not None:
+                        self.last_event_id = event.id
+                    if not event.data:
+                        continue
+                    delay = self.retry
+                    delta = self.parse(event)
+                    if delta is not None:
+                        yield delta
+            except Exception as e:
+                # Closing from another thread breaks the read in various ways
+                if self.closed:
+                    break
+                if not isinstance(e, requests.RequestException):
+                    raise
+                response = e.response
+                if response is not None:
+                    if response.status_code < 500 and response.status_code != 429:
+                        raise
+                    delay = max(delay, self.retry_after(response))
+                self.logger.warning(f"{e} - Subscription stream failed")
+            if self.closed:
+                break
+            self.logger.debug(
+                f"Reconnecting in {delay}s from event {self.last_event_id}"
+            )
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_retry)
+            self.reconnects += 1
+
+    @staticmethod
+    def retry_after(response: requests.Response) -> float:
+        """Seconds the gateway asked to wait in a Retry-After header, else 0."""
+        try:
+            return float(response.headers.get("Retry-After", 0))
+        except ValueError:
+            # An HTTP date rather than seconds
+            return 0
+
+    def close(self) -> None:
+        """Stop the subscription; safe to call from another thread."""
+        with self.lock:
+            self.closed = True
+            if self.response is not None:
+                self.response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -1,21 +1,181 @@
+import asyncio
 import hashlib
+import inspect
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import nullcontext
 from collections.abc import MutableMapping
-from typing import Dict
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    get_type_hints,
+)
 from functools import lru_cache, wraps
 from datetime import datetime, timedelta
-from pydantic import BaseModel, create_model
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_SINGLETON
 import zlib
 import json, base64
 
 
+@lru_cache(maxsize=None)
+def _orjson():
+    from . import config
+
+    backend = config.get("json", {}).get("backend", "auto")
+    if backend == "json":
+        return None
+    try:
+        import orjson
+    except ImportError:
+        if backend == "orjson":
+            raise
+        return None
+    return orjson
+
+
+def json_loads(s):
+    orjson = _orjson()
+    if orjson is not None:
+        return orjson.loads(s)
+    return json.loads(s)
+
+
+def json_dumps(obj, *, default=None, **kwargs) -> str:
+    """Encode `obj` as JSON. Non-string keys become strings as with json, but
+    orjson writes NaN and infinities as null rather than the non-standard NaN."""
+    orjson = _orjson()
+    # orjson has no equivalent for json.dumps formatting options
+    if orjson is not None and not kwargs:
+        return orjson.dumps(
+            obj, default=default, option=orjson.OPT_NON_STR_KEYS
+        ).decode("utf-8")
+    return json.dumps(obj, default=default, **kwargs)
+
+
+def _construct_value(field, value):
+    type_ = field.type_
+    if value is None or not (isinstance(type_, type) and issubclass(type_, BaseModel)):
+        return value
+    if field.shape == SHAPE_SINGLETON:
+        return construct_model(type_, value)
+    if isinstance(value, list):
+        return [construct_model(type_, v) for v in value]
+    return value
+
+
+def construct_model(model_type, obj):
+    """Build `model_type` from decoded JSON without validation, recursing into
+    nested models (pydantic's construct only sets the top level)."""
+    if not isinstance(obj, dict):
+        return obj
+    values = {
+        name: _construct_value(field, obj[field.alias])
+        for name, field in model_type.__fields__.items()
+        if field.alias in obj
+    }
+    return model_type.construct(**values)
+
+
+def parse_response(
+    response_type, rtn, trusted: bool = False, metrics=None, label: str = ""
+):
+    def timed(phase):
+        if metrics is None:
+            return nullcontext()
+        return metrics.timed(label, phase)
+
+    # Equivalent to parse_raw, split so decode and validation are timed apart
+    with timed("decode"):
+        obj = response_type.__config__.json_loads(rtn)
+    with timed("validation"):
+        if trusted:
+            response = construct_model(response_type, obj)
+        else:
+            response = response_type.parse_obj(obj)
+    if response.error:
+        return response.error
+    return response.data
+
+
+class Decoder:
+    """Turns a response body into the result of a typed_response method."""
+
+    def __init__(self, response_type, trusted: bool, metrics, label: str) -> None:
+        self.response_type = response_type
+        self.trusted = trusted
+        self.metrics = metrics
+        self.label = label
+
+    @property
+    def key(self) -> tuple:
+        return self.response_type, self.trusted
+
+    def __call__(self, rtn):
+        return parse_response(
+            self.response_type, rtn, self.trusted, self.metrics, self.label
+        )
+
+
+class Decoded:
+    """A response body already turned into its result by the current Decoder."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value) -> None:
+        self.value = value
+
+
+_decoding = threading.local()
+
+
+def current_decoder() -> Optional[Decoder]:
+    """The Decoder of the typed_response method running on this thread, if any."""
+    return getattr(_decoding, "decoder", None)
+
+
 def typed_response(func):
+    """Parse the body returned by `func` into its annotated response type.
+
+    While `func` runs, its Decoder is available from current_decoder, so the
+    transport may decode the body itself and return it wrapped in Decoded;
+    Comms.get does, so concurrent identical reads share one decoded result.
+    """
+    response_type = None
+
+    @wraps(func)
     def inner(*args, **kwargs):
-        rtn = func(*args, **kwargs)
-        response_type = func.__annotations__["return"]
-        response = response_type.parse_raw(rtn)
-        if response.error:
-            return response.error
-        return response.data
+        nonlocal response_type
+        comms = getattr(args[0], "comms", None)
+        # Skip validation for clients that trust their gateway
+        trusted = getattr(comms, "trusted", False)
+        metrics = getattr(comms, "metrics", None)
+        if response_type is None:
+            # Resolved on first call so string annotations can name lazy models
+            response_type = get_type_hints(func)["return"]
+        decoder = Decoder(response_type, trusted, metrics, func.__qualname__)
+        previous = current_decoder()
+        _decoding.decoder = decoder
+        try:
+            rtn = func(*args, **kwargs)
+        finally:
+            _decoding.decoder = previous
+        if isinstance(rtn, Decoded):
+            return rtn.value
+        if inspect.isawaitable(rtn):
+            # Modules bound to an AsyncComms return coroutines; unwrap once awaited
+            async def awaited():
+                return decoder(await rtn)
+
+            return awaited()
+        return decoder(rtn)
 
     return inner
 
@@ -25,9 +185,13 @@ def string_hash(string: str) -> str:
     return hash_obj.hexdigest()
 
 
+def _flat_key(key: str, sep: str) -> str:
+    return key.replace(sep, "").replace(" ", "_")
+
+
 def _flatten_dict_gen(d, parent_key: str, sep: str):
     for k, v in d.items():
-        k = k.replace(sep, "").replace(" ", "_")
+        k = _flat_key(k, sep)
         new_key = parent_key + sep + k if parent_key else k
         if isinstance(v, MutableMapping):
             yield from flatten_dict(v, new_key, sep=sep).items()
@@ -39,22 +203,249 @@ def flatten_dict(d: MutableMapping, parent_key: str = "", sep: str = ".") -> Dic
     return dict(_flatten_dict_gen(d, parent_key, sep))
 
 
-def timed_lru_cache(seconds: int, maxsize: int = None):
-    def wrapper(wrapped_func):
-        func = lru_cache(maxsize=maxsize)(wrapped_func)
-        func.__lifetime = timedelta(seconds=seconds)
-        func.__expiration = datetime.utcnow() + func.__lifetime
+def _expand_nested(df, sep: str):
+    import pandas as pd
+
+    for name in list(df.columns[df.dtypes == object]):
+        column = df[name]
+        # Decoded JSON objects are always plain dicts, which is much cheaper to
+        # test for than the MutableMapping ABC
+        is_nested = [type(v) is dict for v in column]
+        if not any(is_nested):
+            continue
+        empty = {}
+        expanded = pd.DataFrame.from_records(
+            [v if nested else empty for v, nested in zip(column, is_nested)],
+            index=df.index,
+        )
+        expanded.columns = [_flat_key(k, sep) for k in expanded.columns]
+        expanded = _expand_nested(expanded, sep)
+        expanded.columns = [f"{name}{sep}{k}" for k in expanded.columns]
+        # Rows where the key held a scalar instead of a mapping keep it as is
+        leftover = column.mask(is_nested)
+        if leftover.notna().any():
+            expanded[name] = leftover
+        df = df.drop(columns=name).join(expanded)
+    return df
+
+
+def downcast_frame(df, category_threshold: float = 0.5):
+    """Shrink numeric columns to the smallest dtype that holds them and turn
+    low-cardinality object columns into categoricals."""
+    import pandas as pd
+
+    for name, column in df.items():
+        kind = column.dtype.kind
+        if kind == "f":
+            df[name] = pd.to_numeric(column, downcast="float")
+        elif kind == "i":
+            df[name] = pd.to_numeric(column, downcast="integer")
+        elif kind == "u":
+            df[name] = pd.to_numeric(column, downcast="unsigned")
+        elif kind == "O" and len(column):
+            try:
+                if column.nunique() / len(column) <= category_threshold:
+                    df[name] = column.astype("category")
+            except TypeError:
+                # Unhashable values (lists) cannot be categorical
+                pass
+    return df
+
+
+def flatten_frame(
+    documents: List[MutableMapping],
+    columns: Optional[List[str]] = None,
+    sep: str = ".",
+    dtypes: Optional[Dict[str, Any]] = None,
+    downcast: bool = False,
+    category_threshold: float = 0.5,
+):
+    """Build a DataFrame from documents, one column per (nested) key.
+
+    Nested mappings are expanded a column at a time rather than flattening
+    each document with flatten_dict. `columns` projects the result, and
+    nested keys outside the projection are never expanded.
+    """
+    import pandas as pd
+
+    df = pd.DataFrame.from_records(documents)
+    # Keys are named as by flatten_dict
+    df.columns = [_flat_key(k, sep) for k in df.columns]
+    if columns is not None:
+        wanted = {column.split(sep)[0] for column in columns}
+        df = df[[name for name in df.columns if name in wanted]]
+    df = _expand_nested(df, sep)
+    if columns is not None:
+        df = df.reindex(columns=columns)
+    if dtypes:
+        df = df.astype(dtypes)
+    if downcast:
+        df = downcast_frame(df, category_threshold)
+    return df
+
+
+def _coerce_column(column, type_name: str):
+    """Coerce `column` to `type_name`, returning it and a mask of bad values."""
+    import pandas as pd
+
+    present = column.notna()
+    kind = column.dtype.kind
+    if type_name == "string":
+        if kind in "iufb":
+            return column.astype(str).where(present), present & False
+        if pd.api.types.infer_dtype(column, skipna=True) == "string":
+            return column, present & False
+        return column, present & ~column.map(lambda v: isinstance(v, str))
+    numeric = column if kind in "iuf" else pd.to_numeric(column, errors="coerce")
+    invalid = present & numeric.isna()
+    if type_name == "integer" and numeric.dtype.kind == "f":
+        invalid |= present & (numeric != numeric.round())
+        if present.all() and not invalid.any():
+            numeric = numeric.astype("int64")
+    elif type_name == "number":
+        numeric = numeric.astype("float64")
+    return numeric, invalid
+
+
+def validate_frame(df, fields: Dict[str, tuple], name: str = "DataFrame"):
+    """Validate and coerce `df` against `fields` a column at a time.
+
+    `fields` maps each column to (type name, required, nullable) using the
+    type names of models.data.type_map. Returns a frame holding just those
+    columns; raises ValueError naming every failing column.
+    """
+    errors = []
+    columns = {}
+    for column_name, (type_name, required, nullable) in fields.items():
+        if column_name not in df:
+            if required:
+                errors.append(f"{column_name}: missing")
+            continue
+        column = df[column_name]
+        if not nullable and column.isna().any():
+            errors.append(f"{column_name}: {int(column.isna().sum())} null values")
+            continue
+        coerced, invalid = _coerce_column(column, type_name)
+        if invalid.any():
+            first = invalid.idxmax()
+            errors.append(
+                f"{column_name}: {int(invalid.sum())} values are not {type_name} "
+                f"(first at {first!r}: {column[first]!r})"
+            )
+            continue
+        columns[column_name] = coerced
+    if errors:
+        raise ValueError(f"Invalid {name} records - " + "; ".join(errors))
+    return df.__class__(columns, index=df.index)
+
 
-        @wraps(func)
-        def inner(*args, **kwargs):
-            if (now := datetime.utcnow()) >= func.__expiration:
-                func.cache_clear()
-                func.__expiration = now + func.__lifetime
-            return func(*args, **kwargs)
+def time_windows(start: datetime, end: datetime, step: timedelta):
+    while start < end:
+        stop = min(start + step, end)
+        yield start, stop
+        start = stop
 
-        return inner
 
-    return wrapper
+class SingleFlight:
+    """Collapse concurrent calls sharing a key into one call of the first caller."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.shared = 0
+
+    def do(self, key, func, *args, **kwargs):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return call.result()
+
+        try:
+            rtn = func(*args, **kwargs)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(rtn)
+            return rtn
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+
+def read_ahead(iterable: Iterable, size: int) -> Iterator:
+    """Consume `iterable` on a background thread, up to `size` items ahead."""
+    if size <= 0:
+        yield from iterable
+        return
+
+    items = queue.Queue(maxsize=size)
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        items.put((item, None), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            items.put((done, None))
+        except BaseException as e:
+            items.put((done, e))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+async def aread_ahead(aiterable: AsyncIterable, size: int) -> AsyncIterator:
+    """Consume `aiterable` in a separate task, up to `size` items ahead."""
+    if size <= 0:
+        async for item in aiterable:
+            yield item
+        return
+
+    items = asyncio.Queue(maxsize=size)
+    done = object()
+
+    async def produce():
+        try:
+            async for item in aiterable:
+                await items.put((item, None))
+            await items.put((done, None))
+        except Exception as e:
+            await items.put((done, e))
+
+    task = asyncio.create_task(produce())
+    try:
+        while True:
+            item, error = await items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        task.cancel()
 
 
 def zip_str(s):
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+from . import config
+from .models import data as dataModels
+from .models import response as responseModels
+
+
+class BulkWriterStats:
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.batches = 0
+        self.rows = 0
+        self.retries = 0
+        self.failed = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self) -> str:
+        return (
+            f"BulkWriterStats(batches={self.batches}, rows={self.rows}, "
+            f"retries={self.retries}, failed={self.failed}, "
+            f"rows_per_second={self.rows_per_second:.1f})"
+        )
+
+
+def split_batches(timeseries: dataModels.Timeseries, batch_rows: int):
+    """Yield copies of `timeseries` holding at most `batch_rows` rows each."""
+    df = timeseries.data
+    for offset in range(0, max(len(df), 1), batch_rows):
+        yield timeseries.copy(update={"data": df.iloc[offset : offset + batch_rows]})
+
+
+class BulkWriteError(Exception):
+    """Raised by BulkWriter.close when batches failed after their retries.
+
+    `errors` holds each failed (batch, exception) pair, so the batches can be
+    put again.
+    """
+
+    def __init__(self, errors: list, stats: BulkWriterStats) -> None:
+        super().__init__(f"{len(errors)} batches failed to upload")
+        self.errors = errors
+        self.stats = stats
+
+
+class BulkWriter:
+    """Upload timeseries data in size-bounded batches from a pool of workers.
+
+    `put` splits a Timeseries into batches of at most `batch_rows` rows and
+    queues them; it blocks while `max_pending` batches are waiting, so memory
+    stays bounded by roughly `max_pending + workers` batches. Each worker
+    encodes and posts its batch through `timeseries.add`, retrying failures
+    with exponential backoff. Batches that still fail are collected and
+    raised together by `close` as a BulkWriteError.
+
+        with client.timeseries.bulk_writer() as writer:
+            for ts in series:
+                writer.put(ts)
+    """
+
+    _stop = object()
+
+    def __init__(
+        self,
+        module,
+        batch_rows: Optional[int] = None,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        retries: Optional[int] = None,
+        backoff: Optional[float] = None,
+        progress: Optional[Callable[[BulkWriterStats], None]] = None,
+    ) -> None:
+        bulk_config = config["bulk"]
+        self.module = module
+        self.batch_rows = batch_rows or bulk_config["batch_rows"]
+        self.workers = workers or bulk_config["workers"]
+        self.retries = bulk_config["retries"] if retries is None else retries
+        self.backoff = bulk_config["backoff"] if backoff is None else backoff
+        self.progress = progress
+        self.queue = queue.Queue(maxsize=max_pending or bulk_config["max_pending"])
+        self.stats = BulkWriterStats()
+        self.errors = []
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.closed = False
+        self.threads = [
+            threading.Thread(target=self.work, daemon=True) for _ in range(self.workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def put(self, timeseries: dataModels.Timeseries) -> None:
+        if self.closed:
+            raise ValueError("put on a closed BulkWriter")
+        for batch in split_batches(timeseries, self.batch_rows):
+            self.queue.put(batch)
+
+    def upload(self, batch: dataModels.Timeseries) -> None:
+        for attempt in range(self.retries + 1):
+            try:
+                rtn = self.module.add(batch)
+                if isinstance(rtn, responseModels.Error):
+                    raise Exception(f"Error {rtn.code}: {rtn.message}")
+                return
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                with self.lock:
+                    self.stats.retries += 1
+                self.logger.warning(f"{e} - Retrying batch of {batch.name}")
+                time.sleep(self.backoff * 2**attempt)
+
+    def work(self) -> None:
+        while True:
+            batch = self.queue.get()
+            try:
+                if batch is self._stop:
+                    return
+                self.upload(batch)
+                with self.lock:
+                    self.stats.batches += 1
+                    self.stats.rows += len(batch.data)
+            except Exception as e:
+                self.logger.error(f"{e} - Failed to upload batch of {batch.name}")
+                with self.lock:
+                    self.stats.failed += 1
+                    self.errors.append((batch, e))
+            finally:
+                self.queue.task_done()
+            if self.progress is not None:
+                self.progress(self.stats)
+
+    def close(self) -> BulkWriterStats:
+        """Wait for all queued batches to upload and stop the workers.
+
+        Raises BulkWriteError if any batch failed. Closing again only reports
+        the outcome.
+        """
+        with self.lock:
+            closing, self.closed = not self.closed, True
+        if closing:
+            # Markers from a second close would find no workers and fill the queue
+            for _ in self.threads:
+                self.queue.put(self._stop)
+        for thread in self.threads:
+            thread.join()
+        if self.errors:
+            raise BulkWriteError(self.errors, self.stats) from self.errors[0][1]
+        return self.stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        try:
+            self.close()
+        except BulkWriteError:
+            # Don't hide the exception that ended the block
+            if exc_type is None:
+                raise
+
+
+class AsyncBulkWriter:
+    """Asyncio counterpart of BulkWriter, uploading from `workers` tasks.
+
+    async with client.timeseries.bulk_writer() as writer:
+        for ts in series:
+            await writer.put(ts)
+    """
+
+    def __init__(
+        self,
+        module,
+        batch_rows: Optional[int] = None,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        retries: Optional[int] = None,
+        backoff: Optional[float] = None,
+        progress: Optional[Callable[[BulkWriterStats], None]] = None,
+    ) -> None:
+        bulk_config = config["bulk"]
+        self.module = module
+        self.batch_rows = batch_rows or bulk_config["batch_rows"]
+        self.workers = workers or bulk_config["workers"]
+        self.retries = bulk_config["retries"] if retries is None else retries
+        self.backoff = bulk_config["backoff"] if backoff is None else backoff
+        self.progress = progress
+        self.max_pending = max_pending or bulk_config["max_pending"]
+        self.stats = BulkWriterStats()
+        self.errors = []
+        self.logger = logging.getLogger(self.__class__.__name__)
+        # Created on first put, inside the running event loop
+        self.queue = None
+        self.tasks = []
+        self.closed = False
+
+    def start(self) -> None:
+        self.queue = asyncio.Queue(maxsize=self.max_pending)
+        self.tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+
+    async def put(self, timeseries: dataModels.Timeseries) -> None:
+        if self.closed:
+            raise ValueError("put on a closed AsyncBulkWriter")
+        if self.queue is None:
+            self.start()
+        for batch in split_batches(timeseries, self.batch_rows):
+            await self.queue.put(batch)
+
+    async def upload(self, batch: dataModels.Timeseries) -> None:
+        for attempt in range(self.retries + 1):
+            try:
+                rtn = await self.module.add(batch)
+                if isinstance(rtn, responseModels.Error):
+                    raise Exception(f"Error {rtn.code}: {rtn.message}")
+                return
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                self.stats.retries += 1
+                self.logger.warning(f"{e} - Retrying batch of {batch.name}")
+                await asyncio.sleep(self.backoff * 2**attempt)
+
+    async def work(self) -> None:
+        while True:
+            batch = await self.queue.get()
+            try:
+                if batch is BulkWriter._stop:
+                    return
+                await self.upload(batch)
+                self.stats.batches += 1
+                self.stats.rows += len(batch.data)
+            except Exception as e:
+                self.logger.error(f"{e} - Failed to upload batch of {batch.name}")
+                self.stats.failed += 1
+                self.errors.append((batch, e))
+            finally:
+                self.queue.task_done()
+            if self.progress is not None:
+                self.progress(self.stats)
+
+    async def close(self) -> BulkWriterStats:
+        """Wait for all queued batches to upload and stop the workers.
+
+        Raises BulkWriteError if any batch failed. Closing again only reports
+        the outcome.
+        """
+        if not self.closed:
+            self.closed = True
+            if self.queue is not None:
+                for _ in self.tasks:
+                    await self.queue.put(BulkWriter._stop)
+                await asyncio.gather(*self.tasks)
+        if self.errors:
+            raise BulkWriteError(self.errors, self.stats) from self.errors[0][1]
+        return self.stats
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, *exc_info) -> None:
+        try:
+            await self.close()
+        except BulkWriteError:
+            # Don't hide the exception that ended the block
+            if exc_type is None:
+                raise
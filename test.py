@@ -1,10 +1,136 @@
+import asyncio
 import json
-from time import sleep
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import types
+from datetime import datetime, timedelta
 
-from qshed.client import QShedClient
+import numpy as np
+import pandas as pd
+import pytest
+import requests
 
+from qshed.client import QShedClient, config
+from qshed.client.async_client import AsyncQShedClient
+from qshed.client.cache import ResponseCache
+from qshed.client.disk_cache import DiskCache
+from qshed.client.loader import DataLoader
+from qshed.client.settings import Config
+from qshed.client.store import TimeseriesStore
+from qshed.client.models import data as dataModels
+from qshed.client.models import timeseries as timeseriesModels
+from qshed.client.stream import iter_response_data
+from qshed.client.subscription import Subscription
+from qshed.client import aggregate, compression, utils
+from qshed.client.utils import flatten_dict, flatten_frame
+from qshed.client.writer import AsyncBulkWriter, BulkWriter, BulkWriteError
 
-c = QShedClient("http://localhost:4000")
+from benchmarks.stub_gateway import StubGateway
+
+# Set QSHED_GATEWAY (e.g. http://localhost:4000) to run against a live gateway
+address = os.environ.get("QSHED_GATEWAY")
+stub = None
+if address is None:
+    stub = StubGateway().__enter__()
+    address = stub.address
+c = QShedClient(address)
+# Ids of objects created by earlier tests
+created = {}
+needs_stub = pytest.mark.skipif(stub is None, reason="needs the stub gateway")
+
+
+@pytest.fixture(scope="module", autouse=True)
+def gateway():
+    yield
+    c.close()
+    if stub is not None:
+        stub.__exit__(None, None, None)
+
+
+def test_partial_config(tmp_path, monkeypatch):
+    # A config.yml as the client once required: the caching section only
+    path = tmp_path / "config.yml"
+    path.write_text("caching:\n  enabled: true\n  lifetime: 10\n  maxsize: 50\n")
+    partial = Config().load(str(path))
+    assert partial["caching"]["maxsize"] == 50
+    assert partial["caching"]["ttl"] == config["caching"]["ttl"]
+    assert partial["gateways"] == config["gateways"]
+    monkeypatch.setattr(config, "data", partial)
+    client = QShedClient(address)
+    assert client.gateway.ping() == '"ok"'
+    client.close()
+
+
+@pytest.fixture(params=["json", "orjson"])
+def json_backend(request, monkeypatch):
+    monkeypatch.setitem(config["json"], "backend", request.param)
+    utils._orjson.cache_clear()
+    yield request.param
+    utils._orjson.cache_clear()
+
+
+def test_json_backend(json_backend):
+    assert (utils._orjson() is None) == (json_backend == "json")
+    collection = dataModels.Collection(name="keys", database=1, data=[{1: "a"}])
+    assert json.loads(collection.json())["data"] == [{"1": "a"}]
+    r = dataModels.Collection.parse_raw(collection.json())
+    assert r.data == [{"1": "a"}]
+    assert utils.json_loads(utils.json_dumps({"a": [1, 2.5, None]})) == {
+        "a": [1, 2.5, None]
+    }
+
+
+def test_trusted_decoding():
+    trusted = QShedClient(address, trusted=True)
+    end = datetime(2024, 1, 2)
+    window = dict(start=end - timedelta(days=1), end=end)
+    try:
+        page = trusted.collection.get_page(3, limit=5)
+        assert isinstance(page, dataModels.Collection)
+        assert page == c.collection.get_page(3, limit=5)
+        ts = trusted.timeseries.get(1, **window)[0]
+        assert ts.data.equals(c.timeseries.get(1, **window)[0].data)
+        assert trusted.entity.get(1, 2)[1] == c.entity.get(1, 2)[1]
+    finally:
+        trusted.close()
+
+
+def test_accept_encoding(monkeypatch):
+    assert compression.accept_encoding("gzip, deflate") == "gzip"
+    assert compression.accept_encoding("gzip, deflate, zstd") == "zstd, gzip"
+    monkeypatch.setitem(config["compression"], "enabled", False)
+    assert compression.accept_encoding("gzip, deflate") == "identity"
+
+
+@needs_stub
+def test_compressed_response():
+    assert "gzip" in c.comms.session.headers["Accept-Encoding"]
+    sent = stub.server.bytes_out
+    text = c.comms.get("entity/get", params={"id": list(range(5000, 5300))})
+    assert len(json.loads(text)["data"]) == 300
+    assert stub.server.bytes_out - sent < len(text) / 2
+
+
+@needs_stub
+def test_request_compression(monkeypatch):
+    entities = [{"name": f"entity-{i}", "type": "sensor"} for i in range(200)]
+    size = len(utils.json_dumps(entities))
+    # Off by default: not every gateway decodes request bodies
+    received = stub.server.bytes_in
+    assert (
+        len(json.loads(c.comms.post("entity/create_many", data=entities))["data"])
+        == 200
+    )
+    assert stub.server.bytes_in - received == size
+    monkeypatch.setitem(config["compression"], "request_encoding", "gzip")
+    received = stub.server.bytes_in
+    r = json.loads(c.comms.post("entity/create_many", data=entities))["data"]
+    assert r[-1]["name"] == "entity-199"
+    assert stub.server.bytes_in - received < size / 2
 
 
 def test_gateway_ping():
@@ -12,30 +138,636 @@ def test_gateway_ping():
     assert r == '"ok"'
 
 
-def test_nosql_database_create():
-    r = c.nosql.create("__test_database")
-    assert r == "__test_database"
-    sleep(1)
+def test_entity_create_get():
+    r = c.entity.create(dataModels.Entity())
+    assert isinstance(r, dataModels.Entity)
+    r = c.entity.get(1, 2)
+    assert len(r) == 2
+
+
+def test_collection_database_create():
+    r = c.collection.create_database(
+        dataModels.CollectionDatabase(name="__test_database")
+    )
+    assert r.name == "__test_database"
+    assert r.id is not None
+    created["database"] = r.id
+
+
+def test_collection_create_get():
+    r = c.collection.create(
+        dataModels.Collection(
+            name="__test_collection",
+            database=created["database"],
+            data=[{"data": "test"}],
+        )
+    )
+    assert r.id is not None
+    r = c.collection.get_page(r.id)
+    assert r.data[-1]["data"] == "test"
+
+
+@needs_stub
+def test_hedge_cuts_slow_replica(monkeypatch):
+    gateways_config = config["gateways"]
+    monkeypatch.setitem(gateways_config, "strategy", "round_robin")
+    monkeypatch.setitem(gateways_config, "hedge_percentile", 50)
+    monkeypatch.setitem(gateways_config, "hedge_min_samples", 4)
+    with StubGateway(latency=0.3) as slow:
+        client = QShedClient([stub.address, slow.address])
+        for id in range(4):
+            client.entity.get(id)
+        start = time.perf_counter()
+        for id in range(4, 12):
+            client.entity.get(id)
+        elapsed = time.perf_counter() - start
+        stats = client.comms.balancer.stats()[slow.address]
+        client.close()
+    # Half the requests went to the slow replica and were answered by the hedge
+    assert elapsed < 0.3 * 4
+    assert stats["errors"] == 0
+
+
+@pytest.fixture
+def fresh_stub():
+    """A gateway of its own, so request counts are not shared with other tests."""
+    with StubGateway() as gateway:
+        client = QShedClient(gateway.address)
+        yield gateway, client
+        client.close()
+
+
+def test_cache_ttl_per_endpoint(fresh_stub, monkeypatch):
+    gateway, _ = fresh_stub
+    ttls = {"ping": 0, "entity/": 60, "collection/": 0.1}
+    monkeypatch.setitem(config["caching"], "ttl", ttls)
+    client = QShedClient(gateway.address)
+    for _ in range(2):
+        client.gateway.ping()
+        client.entity.get(1)
+        client.collection.get(2)
+    assert gateway.responses["ping", 200] == 2
+    assert gateway.responses["entity/get", 200] == 1
+    assert gateway.responses["collection/get", 200] == 1
+    time.sleep(0.15)
+    client.entity.get(1)
+    client.collection.get(2)
+    client.close()
+    assert gateway.responses["entity/get", 200] == 1
+    # Expired, so revalidated with the gateway
+    assert gateway.responses["collection/get", 304] == 1
+
+
+def test_cache_revalidates_with_etag(fresh_stub, monkeypatch):
+    gateway, _ = fresh_stub
+    monkeypatch.setitem(config["caching"], "ttl", {"collection/": 0.1})
+    client = QShedClient(gateway.address)
+    first = client.comms.get("collection/get", params={"id": [2]})
+    key = next(iter(client.comms.cache.entries))
+    assert client.comms.cache.entries[key].etag is not None
+    time.sleep(0.15)
+    bytes_out = gateway.server.bytes_out
+    assert client.comms.get("collection/get", params={"id": [2]}) == first
+    assert gateway.responses["collection/get", 304] == 1
+    assert gateway.server.bytes_out == bytes_out
+    # The 304 renewed the entry's TTL, so the next read is served locally
+    assert not client.comms.cache.entries[key].expired
+    client.comms.get("collection/get", params={"id": [2]})
+    client.close()
+    assert gateway.responses["collection/get", 200] == 1
+    assert gateway.responses["collection/get", 304] == 1
+
+
+def test_single_flight(monkeypatch):
+    monkeypatch.setitem(config["caching"], "enabled", False)
+    with StubGateway(latency=0.2) as gateway:
+        client = QShedClient(gateway.address)
+        barrier = threading.Barrier(8)
+        results = [None] * 8
+
+        def read(n):
+            barrier.wait()
+            results[n] = client.collection.get(2)
+
+        threads = [threading.Thread(target=read, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        client.close()
+    assert gateway.responses["collection/get", 200] == 1
+    assert client.comms.inflight.shared == 7
+    # Decoded once and shared
+    assert all(r is results[0] for r in results)
+
+
+def test_cache_stale_while_revalidate(monkeypatch):
+    monkeypatch.setitem(config["caching"], "ttl", {"collection/": 0.1})
+    monkeypatch.setitem(config["caching"], "stale_while_revalidate", 0.5)
+    with StubGateway() as gateway:
+        client = QShedClient(gateway.address)
+        first = client.comms.get("collection/get", params={"id": [2]})
+        time.sleep(0.15)
+        gateway.latency = 0.3
+        start = time.perf_counter()
+        stale = client.comms.get("collection/get", params={"id": [2]})
+        # Served at once while the entry is revalidated in the background
+        assert time.perf_counter() - start < 0.2
+        assert stale == first
+        assert client.comms.cache.stats()["stale_hits"] == 1
+        deadline = time.monotonic() + 5
+        while client.comms.revalidating and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert gateway.responses["collection/get", 304] == 1
+        key = next(iter(client.comms.cache.entries))
+        assert not client.comms.cache.entries[key].expired
+        # Past the stale window the client waits for the gateway again
+        gateway.latency = 0
+        time.sleep(0.7)
+        client.comms.get("collection/get", params={"id": [2]})
+        client.close()
+    assert client.comms.cache.stats()["stale_hits"] == 1
+    assert gateway.responses["collection/get", 304] == 2
+
+
+def test_cache_invalidated_by_post(fresh_stub):
+    gateway, client = fresh_stub
+    client.entity.get_roots()
+    client.entity.get_roots()
+    assert gateway.responses["entity/get_roots", 200] == 1
+    client.entity.create(dataModels.Entity())
+    roots = client.entity.get_roots()
+    assert gateway.responses["entity/get_roots", 200] == 2
+    assert len(roots) == 1
+
+
+def test_cache_skips_errors(fresh_stub):
+    gateway, client = fresh_stub
+    for _ in range(2):
+        with pytest.raises(Exception, match="Error 404"):
+            client.comms.get("datamodel/missing/definition")
+    assert gateway.responses["datamodel/missing/definition", 404] == 2
+    assert client.comms.cache.stats()["entries"] == 0
+
+
+def test_disk_cache_shared_across_processes(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.set("key", "from parent", 60, etag='"1"')
+    code = (
+        "import sys; from qshed.client.disk_cache import DiskCache; "
+        "cache = DiskCache(sys.argv[1]); "
+        "assert cache.lookup('key').value == 'from parent'; "
+        "cache.set('other', 'from child', 60)"
+    )
+    subprocess.run([sys.executable, "-c", code, str(tmp_path)], check=True)
+    assert cache.lookup("other").value == "from child"
+    assert cache.lookup("key").etag == '"1"'
+    cache.close()
+
+
+def test_disk_cache_ttl(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.set("key", "value", 0.1)
+    assert not cache.lookup("key").expired
+    time.sleep(0.15)
+    # Expired entries are still returned, for a conditional request to renew
+    assert cache.lookup("key").expired
+    cache.refresh("key", 60)
+    assert not cache.lookup("key").expired
+    # Without validators, the memory tier drops an expired backing entry
+    memory = ResponseCache(60, ttls={"short": 0.1}, backing=cache)
+    memory.set("short", "value", memory.ttl_for("short"))
+    time.sleep(0.15)
+    assert memory.lookup("short") is None
+    cache.close()
+
+
+def test_disk_cache_eviction(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    for n in range(3):
+        cache.set(f"key{n}", str(n) * 300, 60)
+    # Identical bodies are stored and counted once
+    cache.set("copy", "0" * 300, 60)
+    assert cache.stats()["bytes"] == 900
+    cache.lookup("key0")
+    cache.set("key3", "3" * 300, 60)
+    # key1 was the least recently used
+    assert cache.lookup("key1") is None
+    assert cache.lookup("key0").value == "0" * 300
+    assert cache.stats() == {"entries": 4, "bytes": 900, "evictions": 1}
+    # An invalidated body is only collected once the budget is exceeded
+    cache.invalidate("key2")
+    assert cache.stats()["bytes"] == 900
+    cache.set("key4", "4" * 200, 60)
+    assert cache.stats() == {"entries": 4, "bytes": 800, "evictions": 1}
+    cache.close()
+
+
+def test_metrics_route_labels(fresh_stub):
+    gateway, client = fresh_stub
+    for name in ("__test_a", "__test_b"):
+        Meter = dataModels.DataModel.create_definition("Meter", value=int)
+        client.datamodel.save_definition(name, Meter)
+        client.datamodel.get_definition(name)
+    text = client.comms.metrics.prometheus()
+    route = 'endpoint="datamodel/{name}/definition"'
+    assert f"qshed_client_requests_total{{{route}}} 4.0" in text
+    assert f'qshed_client_latency_seconds_count{{{route},phase="network"}} 4' in text
+    assert "__test_a" not in text and "__test_b" not in text
+    assert 'phase="decode"' in text
+
+
+def test_response_logging(monkeypatch, caplog):
+    class Body(bytes):
+        def __getitem__(self, key):
+            sliced.append(key)
+            return super().__getitem__(key)
+
+    sliced = []
+    monkeypatch.setitem(config["logging"], "body_limit", 10)
+    resp = types.SimpleNamespace(status_code=200, content=Body(b"x" * 1000))
+    with caplog.at_level(logging.INFO, logger="Comms"):
+        c.comms.log_response("ping", resp)
+    # The body is only sliced and formatted when it will be logged
+    assert sliced == [] and not caplog.records
+    with caplog.at_level(logging.DEBUG, logger="Comms"):
+        c.comms.log_response("ping", resp)
+    assert len(sliced) == 1
+    assert caplog.records[0].getMessage() == f"STATUS: 200 CONTENT: {b'x' * 10!r}..."
+
+
+def test_collection_iter_documents_ignored_skip(monkeypatch):
+    get_page = c.collection.get_page
+    documents = list(c.collection.iter_documents(2, page_size=4))
+    assert len(documents) == len(get_page(2, limit=100).data)
+    # A gateway without skip support answers every page with the first one
+    monkeypatch.setattr(
+        c.collection, "get_page", lambda id, skip, **kwargs: get_page(id, **kwargs)
+    )
+    with pytest.raises(Exception, match="did not apply skip=4"):
+        list(c.collection.iter_documents(2, page_size=4))
+
+
+def test_collection_iter_documents_repeated_cursor(monkeypatch):
+    pages = []
+
+    def get_page(id, limit, cursor, **kwargs):
+        pages.append(cursor)
+        data = [{"n": n} for n in range(limit)]
+        return dataModels.Collection(name="c", database=1, data=data, cursor="c1")
+
+    monkeypatch.setattr(c.collection, "get_page", get_page)
+    with pytest.raises(Exception, match="returned cursor c1 again"):
+        list(c.collection.iter_documents(2, page_size=4, prefetch=0))
+    assert pages == [None, "c1"]
+
+
+def test_collection_database_get():
+    r = c.collection.get_database(created["database"])
+    assert r[0].name == "__test_database"
+
+
+def test_timeseries_get():
+    end = datetime(2024, 1, 2)
+    r = c.timeseries.get(1, start=end - timedelta(days=1), end=end)
+    assert len(r) == 1
+    assert isinstance(dict(r[0])["data"], pd.DataFrame)
+    assert isinstance(r[0].copy().dict()["data"], pd.DataFrame)
+    assert isinstance(r[0].data, pd.DataFrame)
+    assert len(r[0].data)
+
+
+def test_store_fetches_gaps(fresh_stub, monkeypatch):
+    gateway, _ = fresh_stub
+    monkeypatch.setitem(config["timeseries"]["store"], "enabled", True)
+    client = QShedClient(gateway.address)
+    day = datetime(2024, 1, 1)
+    first = client.timeseries.get_frame(1, day, day + timedelta(days=1))
+    assert gateway.responses["timeseries/get", 200] == 1
+    # Only the days either side of the one held are requested
+    start, end = day - timedelta(days=1), day + timedelta(days=2)
+    df = client.timeseries.get_frame(1, start, end)
+    assert gateway.responses["timeseries/get", 200] == 3
+    # Fetches include both bounds; rows at the gap boundaries are held once
+    assert df.index.is_unique and df.index.is_monotonic_increasing
+    assert len(df) == 3 * gateway.n_rows - 2
+    assert df.loc[first.index[1:-1]].equals(first.iloc[1:-1])
+    assert client.timeseries.get_frame(1, start, end).equals(df)
+    client.close()
+    assert gateway.responses["timeseries/get", 200] == 3
+
+
+def test_store_spills_to_disk(tmp_path):
+    index = pd.date_range("2024", periods=1000, freq="1min")
+    df = pd.DataFrame({"value": np.arange(1000.0)}, index=index)
+    start, end = index[0].to_pydatetime(), index[-1].to_pydatetime()
+    store = TimeseriesStore(int(df.memory_usage().sum() * 1.5), disk_dir=str(tmp_path))
+    store.add(1, start, end, df)
+    store.add(2, start, end, df * 2)
+    # Series 1 no longer fits in memory and was written out
+    assert list(store.entries) == [2]
+    assert sorted(os.listdir(tmp_path)) == ["1.json", "1.parquet"]
+    assert store.missing(1, start, end) == []
+    pd.testing.assert_frame_equal(store.select(1, start, end), df, check_freq=False)
+    # Reading series 1 back pushed series 2 out
+    assert list(store.entries) == [1]
+    assert store.nbytes <= store.max_bytes
+    pd.testing.assert_frame_equal(store.select(2, start, end), df * 2, check_freq=False)
+    store.clear()
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("parallel", ["thread", "process"])
+def test_parallel_decode(parallel, monkeypatch):
+    ids = list(range(1, 8))
+    end = datetime(2024, 1, 2)
+    start = end - timedelta(days=1)
+    serial = c.timeseries.get(*ids, start=start, end=end)
+    decode_config = config["timeseries"]["decode"]
+    monkeypatch.setitem(decode_config, "parallel", parallel)
+    monkeypatch.setitem(decode_config, "workers", 2)
+    monkeypatch.setitem(decode_config, "chunk_size", 2)
+    try:
+        # Below min_bytes responses are still decoded inline
+        c.timeseries.get(*ids, start=start, end=end)
+        assert not timeseriesModels._decode_pools
+        monkeypatch.setitem(decode_config, "min_bytes", 0)
+        r = c.timeseries.get(*ids, start=start, end=end)
+        assert list(timeseriesModels._decode_pools) == [(parallel, 2)]
+    finally:
+        timeseriesModels.shutdown_decode_pools()
+    # Series come back in order, each decoded as it would be serially
+    assert [ts.id for ts in r] == [ts.id for ts in serial]
+    for ts, expected in zip(r, serial):
+        pd.testing.assert_frame_equal(ts.data, expected.data)
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 7, 250, 5000])
+@pytest.mark.parametrize("agg", aggregate.AGGREGATIONS)
+def test_aggregator_chunks(agg, chunk_rows):
+    rng = np.random.default_rng(0)
+    # Irregular times, so some bins are empty and bins straddle chunks
+    times = pd.Timestamp(2024, 1, 1) + pd.to_timedelta(
+        np.sort(rng.uniform(0, 86400, 1000)), unit="s"
+    )
+    df = pd.DataFrame({"value": rng.standard_normal(1000).cumsum()}, index=times)
+    expected = aggregate.aggregate(df, "15min", agg)
+    aggregator = aggregate.Aggregator("15min", agg)
+    chunks = [df.iloc[n : n + chunk_rows] for n in range(0, len(df), chunk_rows)]
+    frames = [aggregator.add(chunk) for chunk in chunks] + [aggregator.finish()]
+    pd.testing.assert_frame_equal(pd.concat(frames), expected)
+    assert len(expected) == len(df.index.floor("15min").unique())
+
+
+def test_datamodel_definition():
+    Sensor = dataModels.DataModel.create_definition("Sensor", value=float)
+    c.datamodel.save_definition("__test_sensor", Sensor)
+    model = c.datamodel.model("__test_sensor")
+    assert model.__fields__["value"].type_ is float
+    assert c.datamodel.model("__test_sensor") is model
+
+
+def test_datamodel_redefined():
+    Sensor = dataModels.DataModel.create_definition("Sensor", value=float)
+    Tagged = dataModels.DataModel.create_definition("Sensor", value=float, tag=str)
+    c.datamodel.save_definition("__test_redefined", Sensor)
+    first = c.datamodel.model("__test_redefined")
+    # Saving invalidates the name, so the new definition is fetched
+    c.datamodel.save_definition("__test_redefined", Tagged)
+    second = c.datamodel.model("__test_redefined")
+    assert "tag" in second.__fields__
+    # An unchanged definition maps to the class already built for its hash
+    c.datamodel.save_definition("__test_redefined", Sensor)
+    assert c.datamodel.model("__test_redefined") is first
+
+
+def test_datamodel_attribute_called_name():
+    definition = dataModels.DataModelDefinition(
+        name="Site",
+        attributes=[
+            dataModels.DataModelAttribute(name="name", type="string"),
+            dataModels.DataModelAttribute(name="height", type="number"),
+        ],
+    )
+    Site = definition.to_model()
+    assert Site(name="north", height=2.5).name == "north"
+
+
+def test_datamodel_validate_frame():
+    Reading = dataModels.DataModel.create_definition("Reading", value=float, count=int)
+    df = pd.DataFrame({"value": ["1.5", 2], "count": [1.0, 2.0], "extra": [0, 0]})
+    r = Reading.validate_frame(df)
+    assert list(r.columns) == ["value", "count"]
+    assert r["value"].tolist() == [1.5, 2.0]
+    assert r["count"].dtype == "int64"
+    with pytest.raises(ValueError, match="count: 1 values are not integer"):
+        Reading.validate_frame(df.assign(count=[1.0, 2.5]))
+    with pytest.raises(ValueError, match="value: missing"):
+        Reading.validate_frame(df.drop(columns="value"))
+
+
+def test_loader_scope():
+    batches = []
+    loader = DataLoader(lambda keys: batches.append(keys) or keys, wait=0.001)
+    with loader.scope():
+        assert loader.load(1) == 1
+        assert loader.load(1) == 1
+        # Another thread is outside this scope and loads again
+        thread = threading.Thread(target=loader.load, args=(1,))
+        thread.start()
+        thread.join()
+    with loader.scope():
+        loader.load(1)
+    assert batches == [[1], [1], [1]]
+
+
+def test_bulk_writer_failed_batches():
+    class Rejecting:
+        def add(self, batch):
+            raise Exception("Error 500: rejected")
+
+    df = pd.DataFrame({"value": range(5)}, index=pd.date_range("2024", periods=5))
+    ts = dataModels.Timeseries(name="__test_bulk", entity=1, data=df)
+    with pytest.raises(BulkWriteError) as e:
+        with BulkWriter(Rejecting(), batch_rows=2, workers=1, retries=0) as writer:
+            writer.put(ts)
+    assert len(e.value.errors) == 3
+    assert sum(len(batch.data) for batch, _ in e.value.errors) == 5
+
+
+def test_bulk_writer_close_twice():
+    class Accepting:
+        def add(self, batch):
+            return batch
+
+    df = pd.DataFrame({"value": range(5)}, index=pd.date_range("2024", periods=5))
+    ts = dataModels.Timeseries(name="__test_bulk", entity=1, data=df)
+    writer = BulkWriter(Accepting(), batch_rows=2, workers=4, max_pending=1)
+    writer.put(ts)
+    assert writer.close().batches == 3
+    # With no workers left, more stop markers would block on the full queue
+    closer = threading.Thread(target=writer.close, daemon=True)
+    closer.start()
+    closer.join(timeout=2)
+    assert not closer.is_alive()
+    with pytest.raises(ValueError):
+        writer.put(ts)
+
+
+def test_flatten_frame_keys():
+    documents = [{"a b": {"c.d": 1, "e": {"f g": 2}}, "x.y": 3}]
+    df = flatten_frame(documents)
+    assert df.iloc[0].to_dict() == flatten_dict(documents[0])
+    assert list(df.columns) == ["xy", "a_b.cd", "a_b.e.f_g"]
+
+
+def test_stream_large_element():
+    documents = [{"reading": n * 0.5, "tag": f"t{n}"} for n in range(150_000)]
+    body = json.dumps({"data": [{"id": 1, "data": documents}, {"id": 2}]})
+    chunks = [body[i : i + 16384] for i in range(0, len(body), 16384)]
+    assert len(body) > 5_000_000
+    start = time.perf_counter()
+    r = list(iter_response_data(chunks))
+    assert time.perf_counter() - start < 5
+    assert r == [{"id": 1, "data": documents}, {"id": 2}]
+
+
+def test_async_client():
+    async def run():
+        async with AsyncQShedClient(address) as ac:
+            assert isinstance(
+                await ac.entity.create(dataModels.Entity()), dataModels.Entity
+            )
+            assert isinstance(await ac.entity.load(1), dataModels.Entity)
+            end = datetime(2024, 1, 2)
+            ts, df = await ac.gather(
+                ac.timeseries.get(1, start=end - timedelta(days=1), end=end),
+                ac.timeseries.get_frame(1, start=end - timedelta(days=1), end=end),
+            )
+            assert isinstance(df, pd.DataFrame)
+            assert df.equals(ts[0].data)
+            page = await ac.collection.get_page(2, limit=5)
+            assert len(page.data) == 5
+            frame = await ac.collection.get_frame(2, limit=5, columns=["reading"])
+            assert list(frame.columns) == ["reading"]
+            Meter = dataModels.DataModel.create_definition("Meter", value=int)
+            await ac.datamodel.save_definition("__test_meter", Meter)
+            model = await ac.datamodel.model("__test_meter")
+            assert model.__fields__["value"].type_ is int
+            documents = [d async for d in ac.collection.iter_documents(2, page_size=4)]
+            assert documents == (await ac.collection.get_page(2, limit=100)).data
+            entities = [e async for e in ac.entity.iter(1, 2)]
+            assert len(entities) == 2
+            start = end - timedelta(days=3)
+            chunks = [
+                df
+                async for df in ac.timeseries.iter_chunks(
+                    1, start, end, chunk=timedelta(days=1)
+                )
+            ]
+            assert len(chunks) == 3
+            expected = c.timeseries.iter_chunks(1, start, end, chunk=timedelta(days=1))
+            assert pd.concat(chunks).equals(pd.concat(expected))
+            df = pd.DataFrame(
+                {"value": range(5)}, index=pd.date_range("2024", periods=5)
+            )
+            ts = dataModels.Timeseries(name="__test_bulk", entity=1, data=df)
+            async with ac.timeseries.bulk_writer(batch_rows=2, workers=2) as writer:
+                await writer.put(ts)
+            assert writer.stats.batches == 3 and writer.stats.rows == 5
+
+    asyncio.run(run())
+
+
+def test_async_bulk_writer_failed_batches():
+    class Rejecting:
+        async def add(self, batch):
+            raise Exception("Error 500: rejected")
+
+    async def run():
+        df = pd.DataFrame({"value": range(5)}, index=pd.date_range("2024", periods=5))
+        ts = dataModels.Timeseries(name="__test_bulk", entity=1, data=df)
+        writer = AsyncBulkWriter(Rejecting(), batch_rows=2, workers=1, retries=0)
+        with pytest.raises(BulkWriteError) as e:
+            async with writer:
+                await writer.put(ts)
+        assert len(e.value.errors) == 3
+        # Closing again does not wait on the stopped workers
+        with pytest.raises(BulkWriteError):
+            await asyncio.wait_for(writer.close(), 1)
+
+    asyncio.run(run())
+
+
+def publish_delta(id, seq):
+    df = pd.DataFrame(
+        {"seq": [seq]}, index=[pd.Timestamp(2024, 1, 1) + seq * pd.Timedelta("1s")]
+    )
+    body = dataModels.Timeseries(name="live", entity=1, id=id, data=df).json()
+    stub.publish("timeseries", id, body)
+
+
+def consume(subscription, n):
+    """Start reading `subscription` on a thread until `n` deltas have arrived."""
+    received = []
+
+    def run():
+        for delta in subscription:
+            received.extend(delta.data["seq"])
+            if len(received) >= n:
+                subscription.close()
 
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, received
 
-def test_nosql_database_list():
-    r = c.nosql.list()
-    assert "__test_database" in r
 
+@needs_stub
+def test_subscribe_delivery():
+    for seq in range(3):
+        publish_delta(9001, seq)
+    with c.subscribe(timeseries_ids=[9001]) as subscription:
+        thread, received = consume(subscription, 3)
+        thread.join(timeout=10)
+    assert received == [0, 1, 2]
+    assert subscription.last_event_id is not None
 
-def test_nosql_collection_insert_one():
-    r = c.nosql["__test_database"]["__test_collection"].insert_one({"data": "test"})
-    assert isinstance(r, str)
 
+@needs_stub
+def test_subscribe_resume():
+    for seq in range(2):
+        publish_delta(9002, seq)
+    with c.subscribe(timeseries_ids=[9002]) as subscription:
+        thread, received = consume(subscription, 2)
+        thread.join(timeout=10)
+    assert received == [0, 1]
+    publish_delta(9002, 2)
+    last_event_id = subscription.last_event_id
+    with c.subscribe(timeseries_ids=[9002], last_event_id=last_event_id) as resumed:
+        thread, received = consume(resumed, 1)
+        thread.join(timeout=10)
+    assert received == [2]
 
-def test_nosql_collection_list():
-    r = c.nosql["__test_database"].list()
-    assert "__test_collection" in r
 
+@needs_stub
+def test_subscribe_reconnect(monkeypatch):
+    monkeypatch.setitem(config["subscribe"], "retry", 0.05)
+    with c.subscribe(timeseries_ids=[9003]) as subscription:
+        thread, received = consume(subscription, 2)
+        publish_delta(9003, 0)
+        deadline = time.monotonic() + 10
+        while not received and time.monotonic() < deadline:
+            time.sleep(0.01)
+        stub.drop_subscribers()
+        publish_delta(9003, 1)
+        thread.join(timeout=10)
+    assert received == [0, 1]
+    assert subscription.reconnects >= 1
 
-def test_nosql_collection_get():
-    r = c.nosql["__test_database"]["__test_collection"].get()
-    r = json.loads(r)
-    assert "data" in r[-1]
-    assert r[-1]["data"] == "test"
 
+def test_subscribe_client_error():
+    subscription = Subscription(c.comms, "no_such_stream", {}, lambda event: event)
+    with pytest.raises(requests.HTTPError) as e:
+        list(subscription)
+    assert e.value.response.status_code == 404
+    assert subscription.reconnects == 0